@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Async counterparts of the model methods, on AsyncSession + aiosqlite
+
+Lazy relationship loads cannot run under asyncio, so these helpers only
+touch columns or explicitly eager-loaded relationships, and every query that
+returns entities adds raiseload('*') for anything not asked for. Accessing
+an unloaded relationship then fails loudly instead of blocking the loop.
+
+    async with async_session() as session:
+        oldest = await oldest_company(session)
+        devs = await company_devs(session, oldest)
+
+Requires the aiosqlite package.
+"""
+
+from sqlalchemy import event, make_url, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import raiseload
+
+import models
+from models import Company, Dev, Freebie
+from database import DATABASE_URL, POOL_SIZE, MAX_OVERFLOW, apply_sqlite_pragmas
+
+# The models' eager-loading strategies, with every other relationship raising
+FREEBIE_DETAILS = (*models.FREEBIE_DETAILS, raiseload('*'))
+COMPANY_WITH_FREEBIES = (*models.COMPANY_WITH_FREEBIES, raiseload('*'))
+DEV_WITH_FREEBIES = (*models.DEV_WITH_FREEBIES, raiseload('*'))
+
+async_engine = None
+AsyncSessionLocal = async_sessionmaker(expire_on_commit=False)
+
+
+def async_url(url=None):
+    """Turns a sqlite:// URL into its sqlite+aiosqlite:// equivalent"""
+    url = make_url(url or DATABASE_URL)
+    if url.get_backend_name() == 'sqlite' and url.get_driver_name() != 'aiosqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def configure_async_engine(url=None, pool_size=None, max_overflow=None, **kwargs):
+    """(Re)creates the shared async engine and binds AsyncSessionLocal to it"""
+    global async_engine
+
+    url = async_url(url)
+    options = dict(kwargs)
+    in_memory = url.database in (None, '', ':memory:')
+    if not in_memory and 'poolclass' not in options:
+        options['pool_size'] = POOL_SIZE if pool_size is None else pool_size
+        options['max_overflow'] = MAX_OVERFLOW if max_overflow is None else max_overflow
+
+    async_engine = create_async_engine(url, **options)
+    # Pragmas are set on the underlying DBAPI connection, same as the sync engine
+    event.listen(async_engine.sync_engine, 'connect', apply_sqlite_pragmas)
+    AsyncSessionLocal.configure(bind=async_engine)
+    return async_engine
+
+
+def async_session():
+    """Returns a new AsyncSession, creating the async engine on first use"""
+    if async_engine is None:
+        configure_async_engine()
+    return AsyncSessionLocal()
+
+
+async def get_company(session, company_id, options=COMPANY_WITH_FREEBIES):
+    """Returns a Company with the given eager-load options applied"""
+    return await session.scalar(select(Company).where(Company.id == company_id).options(*options))
+
+
+async def get_dev(session, dev_id, options=DEV_WITH_FREEBIES):
+    """Returns a Dev with the given eager-load options applied"""
+    return await session.scalar(select(Dev).where(Dev.id == dev_id).options(*options))
+
+
+async def list_freebies(session, company_id=None, dev_id=None, limit=None):
+    """Returns freebies with dev and company joined in, safe for print_details()"""
+    query = select(Freebie).options(*FREEBIE_DETAILS).order_by(Freebie.id)
+    if company_id is not None:
+        query = query.where(Freebie.company_id == company_id)
+    if dev_id is not None:
+        query = query.where(Freebie.dev_id == dev_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return (await session.scalars(query)).all()
+
+
+async def oldest_company(session):
+    """Async Company.oldest_company()"""
+    return await session.scalar(Company.oldest_company_select().options(raiseload('*')))
+
+
+async def company_devs(session, company):
+    """Async Company.devs"""
+    query = company.devs_select().options(raiseload('*')).order_by(Dev.id)
+    return (await session.scalars(query)).all()
+
+
+async def dev_companies(session, dev):
+    """Async Dev.companies"""
+    query = dev.companies_select().options(raiseload('*')).order_by(Company.id)
+    return (await session.scalars(query)).all()
+
+
+async def received_one(session, dev, item_name):
+    """Async Dev.received_one(), always answered by the EXISTS query"""
+    return await session.scalar(dev.received_one_select(item_name))
+
+
+async def give_freebie(session, company, dev, item_name, value):
+    """Async Company.give_freebie(); the new freebie is added and flushed"""
+    freebie = Freebie(item_name=item_name, value=value, dev_id=dev.id, company_id=company.id)
+    session.add(freebie)
+    await session.flush()
+    return freebie
+
+
+async def give_away(session, giver, dev, freebie):
+    """Async Dev.give_away(); compares foreign keys so no relationship is loaded"""
+    if freebie.dev_id != giver.id:
+        return False
+    freebie.dev_id = dev.id
+    await session.flush()
+    # The many-to-one still points at the giver until reloaded
+    session.expire(freebie, ['dev'])
+    return True
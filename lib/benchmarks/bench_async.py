@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Measures async_db mixed-read throughput at several concurrency levels
+
+Each task loops over oldest_company, company_devs, dev_companies and
+received_one on its own AsyncSession until the shared request budget is used.
+
+Usage (from the lib directory):
+    python benchmarks/bench_async.py [--freebies 100000] [--requests 2000] [--concurrency 1,10,100]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import async_db
+import database
+import synthetic
+from models import Company, Dev
+
+
+async def worker(remaining, company_ids, dev_ids, rng):
+    """Runs mixed reads until the shared request counter hits zero"""
+    done = 0
+    async with async_db.async_session() as session:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            kind = done % 4
+            if kind == 0:
+                await async_db.oldest_company(session)
+            elif kind == 1:
+                company = await session.get(Company, rng.choice(company_ids))
+                await async_db.company_devs(session, company)
+            elif kind == 2:
+                dev = await session.get(Dev, rng.choice(dev_ids))
+                await async_db.dev_companies(session, dev)
+            else:
+                dev = await session.get(Dev, rng.choice(dev_ids))
+                await async_db.received_one(session, dev, "Company 1 T-shirt")
+            done += 1
+            # Drop identity-map state so every request goes to the database
+            session.expunge_all()
+    return done
+
+
+async def run(concurrency, requests, company_ids, dev_ids):
+    remaining = [requests]
+    start = time.perf_counter()
+    counts = await asyncio.gather(*[
+        worker(remaining, company_ids, dev_ids, random.Random(task))
+        for task in range(concurrency)
+    ])
+    return sum(counts), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--freebies', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', default='1,10,100')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = database.configure_engine(db_url)
+        companies, devs = 100, max(100, args.freebies // 20)
+        print(f"Generating {args.freebies:,} freebies...")
+        synthetic.populate(engine, companies=companies, devs=devs, freebies=args.freebies)
+        engine.dispose()
+
+        company_ids = list(range(1, companies + 1))
+        dev_ids = list(range(1, devs + 1))
+        for concurrency in levels:
+            async_engine = async_db.configure_async_engine(db_url, pool_size=concurrency, max_overflow=0)
+            done, elapsed = asyncio.run(run(concurrency, args.requests, company_ids, dev_ids))
+            print(f"  {concurrency:>4} tasks: {done:,} requests in {elapsed:.2f}s "
+                  f"({done / elapsed:,.0f} req/sec)")
+            asyncio.run(async_engine.dispose())
+
+
+if __name__ == '__main__':
+    main()
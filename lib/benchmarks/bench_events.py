@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Times keeping a mirror of freebies in sync: full-table diff vs the event feed
+
+A mirror (freebie id -> dev, company, item, value) is copied from a
+synthetic database together with latest_seq(). Then, for each change
+count, that many freebies are created, transferred or deleted in small
+transactions, and the mirror is brought up to date twice:
+
+  full diff    read every freebie and compare it with the mirror
+  event feed   EventConsumer.batches() from the mirror's checkpoint
+
+Both results are checked against the table. The diff costs the same
+whatever changed; the feed costs in proportion to the changes. The cost of
+writing the events is reported too, as insert time with and without the
+event triggers.
+
+Usage (from the lib directory):
+    python benchmarks/bench_events.py [--freebies 1000000] [--changes 100 1000 10000 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+
+import database
+import events
+import synthetic
+
+COMPANIES = 100
+DEVS = 10000
+CHANGES_PER_TRANSACTION = 100
+OVERHEAD_ROWS = 100000
+
+
+def read_table(connection):
+    return {row[0]: tuple(row[1:]) for row in connection.exec_driver_sql(
+        "SELECT id, dev_id, company_id, item_id, value FROM freebies")}
+
+
+def snapshot(engine):
+    """Copies freebies and latest_seq() in one read transaction, as a new consumer starts"""
+    with engine.connect() as connection:
+        connection.exec_driver_sql("BEGIN")
+        mirror = read_table(connection)
+        seq = events.latest_seq(connection)
+        connection.rollback()
+    return mirror, seq
+
+
+def make_changes(engine, count, rng):
+    """Creates, transfers and deletes count freebies in total, in small transactions"""
+    with engine.connect() as connection:
+        low, high = connection.exec_driver_sql("SELECT MIN(id), MAX(id) FROM freebies").one()
+    done = 0
+    while done < count:
+        with engine.begin() as connection:
+            for _ in range(min(CHANGES_PER_TRANSACTION, count - done)):
+                kind = rng.random()
+                freebie_id = rng.randrange(low, high + 1)
+                if kind < 0.6:
+                    connection.execute(text("UPDATE freebies SET dev_id = :dev_id WHERE id = :id"),
+                                       {'dev_id': rng.randrange(1, DEVS + 1), 'id': freebie_id})
+                elif kind < 0.8:
+                    connection.execute(text("DELETE FROM freebies WHERE id = :id"), {'id': freebie_id})
+                else:
+                    connection.execute(text(
+                        "INSERT INTO freebies (item_id, value, dev_id, company_id) "
+                        "VALUES (1, :value, :dev_id, :company_id)"
+                    ), {'value': rng.randrange(100, 1000), 'dev_id': rng.randrange(1, DEVS + 1),
+                        'company_id': rng.randrange(1, COMPANIES + 1)})
+                done += 1
+
+
+def sync_by_diff(engine, mirror):
+    """Applies the differences between the table and mirror; returns how many rows changed"""
+    with engine.connect() as connection:
+        current = read_table(connection)
+    changed = 0
+    for freebie_id in mirror.keys() - current.keys():
+        del mirror[freebie_id]
+        changed += 1
+    for freebie_id, row in current.items():
+        if mirror.get(freebie_id) != row:
+            mirror[freebie_id] = row
+            changed += 1
+    return changed
+
+
+def sync_by_events(consumer, mirror):
+    """Applies new events to mirror; returns how many were read"""
+    applied = 0
+    for batch in consumer.batches():
+        for event in batch:
+            if event.kind == 'delete':
+                mirror.pop(event.freebie_id, None)
+            else:
+                mirror[event.freebie_id] = (event.to_dev_id, event.company_id, event.item_id, event.value)
+        applied += len(batch)
+    return applied
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def insert_overhead(engine, rows):
+    """Seconds to insert rows freebies, 100 per transaction, with and without the event triggers"""
+    rng = random.Random(1)
+    params = [{'value': rng.randrange(100, 1000), 'dev_id': rng.randrange(1, DEVS + 1),
+               'company_id': rng.randrange(1, COMPANIES + 1)} for _ in range(rows)]
+    insert = text("INSERT INTO freebies (item_id, value, dev_id, company_id) VALUES (1, :value, :dev_id, :company_id)")
+
+    def load():
+        start = time.perf_counter()
+        for i in range(0, rows, CHANGES_PER_TRANSACTION):
+            with engine.begin() as connection:
+                connection.execute(insert, params[i:i + CHANGES_PER_TRANSACTION])
+        return time.perf_counter() - start
+
+    load()  # the first load also grows the file and warms the cache
+    with_events = load()
+    with engine.begin() as connection:
+        events.drop_triggers(connection)
+    without_events = load()
+    with engine.begin() as connection:
+        events.create_triggers(connection)
+    return with_events, without_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--freebies', type=int, default=1000000)
+    parser.add_argument('--changes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--batch-size', type=int, default=events.DEFAULT_BATCH_SIZE, help="Events per consumer batch")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.configure_engine(f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        elapsed = synthetic.populate(engine, companies=COMPANIES, devs=DEVS, freebies=args.freebies)
+        print(f"Populated {args.freebies:,} freebies in {elapsed:.1f}s")
+
+        diff_mirror, seq = snapshot(engine)
+        feed_mirror = dict(diff_mirror)
+        consumer = events.EventConsumer('bench', engine, batch_size=args.batch_size)
+        consumer.seek(seq)
+        # The load's create events are covered by the snapshot
+        events.compact_events(engine)
+
+        results = []
+        for count in args.changes:
+            make_changes(engine, count, rng)
+            changed, diff_seconds = timed(sync_by_diff, engine, diff_mirror)
+            applied, feed_seconds = timed(sync_by_events, consumer, feed_mirror)
+            with engine.connect() as connection:
+                table = read_table(connection)
+            if diff_mirror != table or feed_mirror != table:
+                raise RuntimeError(f"mirror out of sync after {count:,} changes")
+            results.append((count, changed, diff_seconds, applied, feed_seconds))
+            events.compact_events(engine)
+
+        with_events, without_events = insert_overhead(engine, OVERHEAD_ROWS)
+
+    print(f"{'changes':>9} {'full diff':>11} {'rows changed':>13} {'event feed':>11} {'events':>8} {'speedup':>8}")
+    for count, changed, diff_seconds, applied, feed_seconds in results:
+        print(f"{count:9,} {diff_seconds * 1000:9.1f}ms {changed:13,} {feed_seconds * 1000:9.1f}ms "
+              f"{applied:8,} {diff_seconds / feed_seconds:7.0f}x")
+    print(f" Inserting {OVERHEAD_ROWS:,} freebies: {with_events:.2f}s with event triggers, "
+          f"{without_events:.2f}s without ({with_events / without_events - 1:+.0%})")
+
+
+if __name__ == '__main__':
+    main()
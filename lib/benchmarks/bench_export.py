@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Measures ledger export throughput and peak RSS for each output format
+
+Each export runs in a fresh export_ledger.py process so its peak RSS is
+its own. Flat memory shows up as the same peak RSS at every size.
+
+Usage (from the lib directory):
+    python benchmarks/bench_export.py [--sizes 100000,1000000]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LIB_DIR)
+
+import database
+import synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--formats', default='csv,jsonl,parquet')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            engine = database.configure_engine(url)
+            print(f"Generating {size:,} freebies...")
+            synthetic.populate(engine, companies=100, devs=max(100, size // 20), freebies=size)
+            engine.dispose()
+
+            for file_format in args.formats.split(','):
+                path = os.path.join(tmp, f'ledger.{file_format}')
+                completed = subprocess.run(
+                    [sys.executable, 'export_ledger.py', path, '--quiet', '--chunk-size', str(args.chunk_size)],
+                    cwd=LIB_DIR, env={**os.environ, 'FREEBIES_DATABASE_URL': url},
+                    capture_output=True, text=True,
+                )
+                if completed.returncode:
+                    print(f"  {file_format:<8} failed: {completed.stderr.strip().splitlines()[-1]}")
+                    continue
+                summary = completed.stdout.strip().splitlines()[-1].strip()
+                print(f"  {file_format:<8} {summary} -> {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
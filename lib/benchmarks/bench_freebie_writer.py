@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Compares one commit per give_freebie with FreebieWriter's grouped commits
+
+Usage (from the lib directory):
+    python benchmarks/bench_freebie_writer.py [--freebies 20000] [--threads 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import func, select
+
+import database
+import synthetic
+from models import Company, Dev, Freebie
+from freebie_writer import FreebieWriter
+
+COMPANIES = 100
+DEVS = 10000
+
+
+def one_commit_per_freebie(count, threads, seed=0):
+    """The current pattern: give_freebie, add, commit, from each thread"""
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        session = database.new_session()
+        for _ in range(count // threads):
+            company = session.get(Company, rng.randrange(1, COMPANIES + 1))
+            dev = session.get(Dev, rng.randrange(1, DEVS + 1))
+            session.add(company.give_freebie(dev, "Sticker", rng.randrange(1, 1000)))
+            session.commit()
+        session.close()
+    return _run_threads(worker, threads)
+
+
+def write_behind(count, threads, writer, seed=0):
+    """Same calls through FreebieWriter; every future is awaited before stopping the clock"""
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        futures = [
+            writer.give_freebie(rng.randrange(1, COMPANIES + 1), rng.randrange(1, DEVS + 1),
+                                "Sticker", rng.randrange(1, 1000))
+            for _ in range(count // threads)
+        ]
+        for future in futures:
+            future.result()
+    return _run_threads(worker, threads)
+
+
+def _run_threads(worker, threads):
+    """Runs worker(i) on each thread; re-raises the first worker's exception"""
+    errors = []
+
+    def run(worker_id):
+        try:
+            worker(worker_id)
+        except BaseException as error:
+            errors.append(error)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {threads} worker threads failed") from errors[0]
+    return elapsed
+
+
+def _timed_inserts(engine, count, threads, run):
+    """Runs run(count, threads) and returns (rows written, elapsed seconds)
+
+    Each thread writes count // threads rows; a rate is only reported once
+    the table has grown by exactly that many.
+    """
+    expected = count // threads * threads
+    with engine.connect() as connection:
+        before = connection.scalar(select(func.count()).select_from(Freebie))
+    elapsed = run(count, threads)
+    with engine.connect() as connection:
+        written = connection.scalar(select(func.count()).select_from(Freebie)) - before
+    if written != expected:
+        raise RuntimeError(f"expected {expected:,} new freebies, found {written:,}")
+    return written, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--freebies', type=int, default=20000)
+    parser.add_argument('--baseline-freebies', type=int, default=2000,
+                        help="One commit per row is slow, so the baseline runs fewer")
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--flush-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        synthetic.populate(engine, companies=COMPANIES, devs=DEVS, freebies=0)
+
+        written, elapsed = _timed_inserts(engine, args.baseline_freebies, args.threads, one_commit_per_freebie)
+        print(f"One commit per freebie ({args.threads} threads):")
+        print(f"  {written:,} freebies in {elapsed:.2f}s ({written / elapsed:,.0f} inserts/sec)")
+
+        writer = FreebieWriter(engine, batch_size=args.batch_size, flush_interval=args.flush_ms / 1000)
+        with writer:
+            written, elapsed = _timed_inserts(
+                engine, args.freebies, args.threads,
+                lambda count, threads: write_behind(count, threads, writer),
+            )
+        stats = writer.stats.as_dict()
+        print(f"FreebieWriter ({args.threads} threads, batch {args.batch_size}, {args.flush_ms:g}ms):")
+        print(f"  {written:,} freebies in {elapsed:.2f}s ({written / elapsed:,.0f} inserts/sec)")
+        print(f"  {stats['batches']} batches, mean {stats['mean_batch_size']:.0f} rows, "
+              f"p50 {stats['batch_p50_seconds'] * 1000:.1f}ms, p99 {stats['batch_p99_seconds'] * 1000:.1f}ms, "
+              f"max queue depth {stats['max_queue_depth']:,}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Measures what moving item names into the items catalog saves
+
+A temporary database is migrated to the revision before the catalog
+and filled with synthetic freebies whose item_name strings
+repeat, as they do in production. Database size and a set of item-name
+queries are measured, the catalog migration is run, and the same data is
+measured again. Both sides are VACUUMed first, so sizes compare pages
+actually in use.
+
+Usage (from the lib directory):
+    python benchmarks/bench_items.py [--freebies 10000000] [--output bench_items.json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, LIB_DIR)
+
+import synthetic
+from counters import REBUILD_STATEMENTS
+
+BEFORE_REVISION = 'f2b8d61a4c3e'
+SCAN_RUNS = 3
+
+# (label, SQL on the string column, SQL on the catalog); ? is filled from a
+# sample (dev_id, item_name) pair
+QUERIES = [
+    ("received_one (dev, name)",
+     "SELECT EXISTS(SELECT 1 FROM freebies WHERE dev_id = ? AND item_name = ?)",
+     "SELECT EXISTS(SELECT 1 FROM freebies WHERE dev_id = ? AND item_id = "
+     "(SELECT id FROM items WHERE name = ?))"),
+    ("count by name",
+     "SELECT COUNT(*) FROM freebies WHERE item_name = ?",
+     "SELECT COUNT(*) FROM freebies WHERE item_id = (SELECT id FROM items WHERE name = ?)"),
+    ("group by name",
+     "SELECT item_name, COUNT(*), SUM(value) FROM freebies GROUP BY item_name",
+     "SELECT items.name, totals.freebies, totals.value FROM ("
+     "SELECT item_id, COUNT(*) AS freebies, SUM(value) AS value FROM freebies GROUP BY item_id"
+     ") AS totals JOIN items ON items.id = totals.item_id"),
+    ("full scan SUM(value)",
+     "SELECT SUM(value) FROM freebies NOT INDEXED",
+     "SELECT SUM(value) FROM freebies NOT INDEXED"),
+]
+
+
+def alembic_upgrade(env, revision):
+    start = time.perf_counter()
+    subprocess.run(['alembic', 'upgrade', revision], cwd=LIB_DIR, env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def load(db_path, companies, devs, freebies, batch_size=100000):
+    """Fills the pre-catalog schema, with its triggers off and rebuilt once at the end"""
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    triggers = connection.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'freebies'"
+    ).fetchall()
+    connection.execute("BEGIN")
+    for name, _ in triggers:
+        connection.execute(f"DROP TRIGGER {name}")
+    connection.executemany("INSERT INTO companies (id, name, founding_year) VALUES (?, ?, 2000)",
+                           [(i, f"Company {i}") for i in range(1, companies + 1)])
+    connection.executemany("INSERT INTO devs (id, name) VALUES (?, ?)",
+                           [(i, f"Dev {i}") for i in range(1, devs + 1)])
+    rows = synthetic.freebie_rows(companies, devs, freebies)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        connection.executemany(
+            "INSERT INTO freebies (item_name, value, dev_id, company_id) VALUES (?, ?, ?, ?)", batch)
+    for statement in REBUILD_STATEMENTS:
+        connection.execute(statement)
+    for _, sql in triggers:
+        connection.execute(sql)
+    connection.execute("INSERT INTO freebies_fts (freebies_fts) VALUES ('rebuild')")
+    connection.execute("COMMIT")
+    connection.close()
+
+
+def measure(db_path, samples, calls, catalog):
+    """VACUUMs, then returns sizes in MB and per-query milliseconds"""
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    connection.execute("VACUUM")
+    sizes = dict(connection.execute(
+        "SELECT name, SUM(pgsize) / 1e6 FROM dbstat GROUP BY name ORDER BY 2 DESC").fetchall())
+    result = {'file_mb': os.path.getsize(db_path) / 1e6, 'objects_mb': sizes, 'query_ms': {}}
+    for label, before_sql, after_sql in QUERIES:
+        sql = after_sql if catalog else before_sql
+        params = sql.count('?')
+        # Whole-table queries take seconds at 10M rows, so they run only a few times
+        runs = calls if params else SCAN_RUNS
+        start = time.perf_counter()
+        for dev_id, item_name in itertools.islice(itertools.cycle(samples), runs):
+            connection.execute(sql, (dev_id, item_name)[-params:] if params else ()).fetchall()
+        result['query_ms'][label] = (time.perf_counter() - start) / runs * 1000
+    connection.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--freebies', type=int, default=10000000)
+    parser.add_argument('--companies', type=int, default=100)
+    parser.add_argument('--devs', type=int, default=100000)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        env = {**os.environ, 'FREEBIES_DATABASE_URL': f'sqlite:///{db_path}'}
+        alembic_upgrade(env, BEFORE_REVISION)
+
+        print(f"Loading {args.freebies:,} freebies with item_name strings...")
+        start = time.perf_counter()
+        load(db_path, args.companies, args.devs, args.freebies)
+        print(f" Loaded in {time.perf_counter() - start:.0f}s")
+
+        rng = random.Random(1)
+        with sqlite3.connect(db_path) as connection:
+            max_id = connection.execute("SELECT MAX(id) FROM freebies").fetchone()[0]
+            samples = [
+                connection.execute("SELECT dev_id, item_name FROM freebies WHERE id = ?",
+                                   (rng.randrange(1, max_id + 1),)).fetchone()
+                for _ in range(100)
+            ]
+
+        before = measure(db_path, samples, args.calls, catalog=False)
+        migration_seconds = alembic_upgrade(env, 'head')
+        after = measure(db_path, samples, args.calls, catalog=True)
+
+    print(f" Catalog migration took {migration_seconds:.0f}s")
+    print(f"{'':<28} {'strings':>10} {'catalog':>10} {'change':>8}")
+    print(f"{'database file':<28} {before['file_mb']:8.0f}MB {after['file_mb']:8.0f}MB "
+          f"{after['file_mb'] / before['file_mb'] - 1:+8.0%}")
+    for name in ('freebies', 'freebies_fts_data', 'items_fts_data', 'items'):
+        if name in before['objects_mb'] or name in after['objects_mb']:
+            b, a = before['objects_mb'].get(name, 0.0), after['objects_mb'].get(name, 0.0)
+            print(f"  {name:<26} {b:8.0f}MB {a:8.0f}MB")
+    indexes = lambda sizes: sum(mb for name, mb in sizes.items() if name.startswith('ix_freebies'))
+    print(f"  {'freebies indexes':<26} {indexes(before['objects_mb']):8.0f}MB {indexes(after['objects_mb']):8.0f}MB")
+    for label, _, _ in QUERIES:
+        b, a = before['query_ms'][label], after['query_ms'][label]
+        print(f"{label:<28} {b:8.3f}ms {a:8.3f}ms {a / b - 1:+8.0%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'freebies': args.freebies,
+                'migration_seconds': migration_seconds,
+                'before': before,
+                'after': after,
+            }, f, indent=2)
+        print(f" Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Measures load_freebies throughput from a CSV file into a fresh SQLite file
+
+Usage (from the lib directory):
+    python benchmarks/bench_load_freebies.py [--rows 1000000] [--batch-size 10000]
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from models import Base
+from load_freebies import load_freebies, read_records
+
+TARGET_ROWS_PER_SEC = 100000
+
+
+def write_csv(path, rows, companies=200, devs=20000, items=500, seed=0):
+    """Writes rows random giveaway records to path"""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['item_name', 'value', 'dev', 'company', 'founding_year'])
+        for _ in range(rows):
+            company = rng.randrange(companies)
+            writer.writerow([
+                f"Item {rng.randrange(items)}",
+                rng.randrange(100, 1000000),
+                f"Dev {rng.randrange(devs)}",
+                f"Company {company}",
+                1950 + company % 75,
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'giveaways.csv')
+        print(f"Writing {args.rows:,} records to CSV...")
+        write_csv(csv_path, args.rows)
+
+        print(f"Loading with batch size {args.batch_size:,}...")
+        for defer_indexes in (False, True):
+            db_path = os.path.join(tmp, f'bench_{defer_indexes}.db')
+            engine = database.configure_engine(f"sqlite:///{db_path}")
+            Base.metadata.create_all(engine)
+
+            start = time.perf_counter()
+            stats = load_freebies(read_records(csv_path), engine=engine,
+                                  batch_size=args.batch_size, defer_indexes=defer_indexes)
+            elapsed = time.perf_counter() - start
+
+            rate = stats['rows'] / elapsed
+            label = "deferred indexes" if defer_indexes else "live indexes"
+            verdict = "meets" if rate >= TARGET_ROWS_PER_SEC else "below"
+            print(f"  {label:<17} {stats['rows']:,} rows in {elapsed:.2f}s: {rate:,.0f} rows/sec "
+                  f"({verdict} the {TARGET_ROWS_PER_SEC:,} rows/sec target)")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Times every model method and hot query over synthetic datasets
+
+Each size gets a fresh SQLite file filled by synthetic.populate(). Every
+benchmark runs --repeat times on a new session and the median is reported.
+Results are written as JSON so runs from different commits can be diffed.
+
+Usage (from the lib directory):
+    python benchmarks/bench_models.py [--sizes 1000,100000,1000000] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import sqlalchemy
+
+import database
+import synthetic
+from cache import ModelCache
+from models import Company, Dev, Freebie, Item, transfer_freebies
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Registers fn(session, ctx) as a benchmark called name"""
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+# The busiest company (rank 1 under the Zipf skew) and an average dev are the
+# interesting cases: one has a huge freebies collection, the other a small one
+
+@benchmark("Company.oldest_company")
+def _(session, ctx):
+    Company.oldest_company(session)
+
+
+@benchmark("Company.devs")
+def _(session, ctx):
+    session.get(Company, ctx['company_id']).devs
+
+
+@benchmark("Company.devs_count")
+def _(session, ctx):
+    session.get(Company, ctx['company_id']).devs_count
+
+
+@benchmark("Company.freebies")
+def _(session, ctx):
+    session.get(Company, ctx['company_id']).freebies
+
+
+@benchmark("Company.give_freebie")
+def _(session, ctx):
+    company = session.get(Company, ctx['company_id'])
+    session.add(company.give_freebie(session.get(Dev, ctx['dev_id']), "Benchmark swag", 1))
+    session.flush()
+    session.rollback()
+
+
+@benchmark("Dev.companies")
+def _(session, ctx):
+    session.get(Dev, ctx['dev_id']).companies
+
+
+@benchmark("Dev.freebies")
+def _(session, ctx):
+    session.get(Dev, ctx['dev_id']).freebies
+
+
+@benchmark("Dev.received_one")
+def _(session, ctx):
+    session.get(Dev, ctx['dev_id']).received_one(ctx['item_name'])
+
+
+@benchmark("Dev.received_many")
+def _(session, ctx):
+    session.get(Dev, ctx['dev_id']).received_many(ctx['item_names'])
+
+
+@benchmark("Freebie.who_received")
+def _(session, ctx):
+    Freebie.who_received(ctx['item_name'], ctx['dev_ids'], session)
+
+
+@benchmark("Dev.give_away")
+def _(session, ctx):
+    giver = session.get(Dev, ctx['dev_id'])
+    freebie = session.query(Freebie).filter_by(dev_id=giver.id).first()
+    giver.give_away(session.get(Dev, ctx['other_dev_id']), freebie)
+    session.flush()
+    session.rollback()
+
+
+@benchmark("Dev.give_away_all")
+def _(session, ctx):
+    session.get(Dev, ctx['dev_id']).give_away_all(session.get(Dev, ctx['other_dev_id']))
+    session.rollback()
+
+
+@benchmark("transfer_freebies x1000")
+def _(session, ctx):
+    company = session.get(Company, ctx['company_id'])
+    rows = session.query(Freebie.id, Freebie.dev_id).filter_by(company_id=company.id).limit(1000)
+    by_dev = {}
+    for freebie_id, dev_id in rows:
+        by_dev.setdefault(dev_id, []).append(freebie_id)
+    to_dev = session.get(Dev, ctx['other_dev_id'])
+    for dev_id, freebie_ids in by_dev.items():
+        if dev_id != to_dev.id:
+            transfer_freebies(freebie_ids, session.get(Dev, dev_id), to_dev)
+    session.rollback()
+
+
+MODEL_CACHE = ModelCache()
+
+
+@benchmark("ModelCache.company_devs (detached)")
+def _(session, ctx):
+    MODEL_CACHE.company_devs(session.get(Company, ctx['company_id']))
+
+
+@benchmark("ModelCache.company_devs (merged)")
+def _(session, ctx):
+    MODEL_CACHE.company_devs(session.get(Company, ctx['company_id']), session)
+
+
+@benchmark("Freebie.print_details x100")
+def _(session, ctx):
+    for freebie in session.query(Freebie).limit(100):
+        freebie.print_details()
+
+
+def dataset_shape(freebies):
+    """Scales companies and devs with the number of freebies"""
+    return {
+        'companies': max(10, freebies // 10000),
+        'devs': max(100, freebies // 20),
+        'freebies': freebies,
+    }
+
+
+def context_for():
+    """Picks the ids and names the benchmarks query for"""
+    session = database.new_session()
+    try:
+        company_id = session.query(Freebie.company_id).group_by(Freebie.company_id).order_by(
+            sqlalchemy.func.count().desc()).limit(1).scalar()
+        dev_id, item_name = session.query(Freebie.dev_id, Freebie.item_name).order_by(
+            Freebie.id).first()
+        other_dev_id = session.query(Dev.id).filter(Dev.id != dev_id).limit(1).scalar()
+        item_names = [name for (name,) in session.query(Item.name).limit(1000)]
+        dev_ids = [dev for (dev,) in session.query(Dev.id).limit(5000)]
+    finally:
+        session.close()
+    return {
+        'company_id': company_id,
+        'dev_id': dev_id,
+        'other_dev_id': other_dev_id,
+        'item_name': item_name,
+        'item_names': item_names,
+        'dev_ids': dev_ids,
+    }
+
+
+def run_benchmark(fn, ctx, repeat):
+    """Returns per-run seconds for fn, each run on a fresh session"""
+    timings = []
+    for _ in range(repeat):
+        session = database.new_session()
+        try:
+            start = time.perf_counter()
+            fn(session, ctx)
+            timings.append(time.perf_counter() - start)
+        finally:
+            session.close()
+    return timings
+
+
+def git_revision():
+    """Returns the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help="Comma-separated freebie counts")
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help="Run only benchmarks whose name contains this")
+    parser.add_argument('--output', default='bench_models.json')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            shape = dataset_shape(size)
+            engine = database.configure_engine(f"sqlite:///{os.path.join(tmp, f'bench_{size}.db')}")
+            print(f"\n{size:,} freebies ({shape['companies']:,} companies, {shape['devs']:,} devs)")
+            print(f"  generated in {synthetic.populate(engine, skew=args.skew, **shape):.1f}s")
+            ctx = context_for()
+            MODEL_CACHE.store.clear()
+
+            for name, fn in BENCHMARKS:
+                if args.only and args.only not in name:
+                    continue
+                timings = run_benchmark(fn, ctx, args.repeat)
+                median = statistics.median(timings)
+                print(f"  {name:<32} {median * 1000:10.3f} ms")
+                results.append({
+                    'benchmark': name,
+                    'freebies': size,
+                    'median_seconds': median,
+                    'min_seconds': min(timings),
+                    'runs': len(timings),
+                })
+            engine.dispose()
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'skew': args.skew,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compares Company.oldest_company() with a per-call engine vs the shared pool
+
+Usage (from the lib directory):
+    python benchmarks/bench_oldest_company.py [--calls 10000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from models import Base, Company
+
+
+def oldest_company_per_call_engine(db_url):
+    """The original implementation: new engine and sessionmaker on every call"""
+    engine = create_engine(db_url)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    oldest = session.query(Company).order_by(Company.founding_year.asc()).first()
+    session.close()
+    return oldest
+
+
+def timed(label, calls, fn):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<32} {elapsed:8.3f}s  ({calls / elapsed:,.0f} calls/sec)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = database.configure_engine(db_url)
+        Base.metadata.create_all(engine)
+
+        session = database.new_session()
+        session.add_all([
+            Company(name="ODM", founding_year=2005),
+            Company(name="UDA", founding_year=2022),
+            Company(name="DCP", founding_year=2025),
+        ])
+        session.commit()
+
+        print(f"Company.oldest_company() x {args.calls:,}")
+        before = timed("per-call create_engine", args.calls,
+                       lambda: oldest_company_per_call_engine(db_url))
+        after = timed("shared pool", args.calls, Company.oldest_company)
+        reused = timed("shared pool, caller session", args.calls,
+                       lambda: Company.oldest_company(session))
+        print(f"  speedup: {before / after:.1f}x (shared), {before / reused:.1f}x (caller session)")
+
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
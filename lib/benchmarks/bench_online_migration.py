@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Times an online rebuild of freebies against op.batch_alter_table()
+
+Both rebuild the same synthetic table to add a column, on identical copies
+of one database, while a writer thread inserts a freebie every few
+milliseconds. The batch rebuild copies every row in one transaction, so
+the writer waits for all of it. The online rebuild commits chunk by chunk,
+so the writer waits at most for one chunk, plus the final swap.
+
+Reported per mode: total migration time, writes that got through during
+it, the writer's commit latency (p50, p99, max), and counter rows left
+stale. Batch mode commits the rebuilt table before its counter triggers
+are back, so writes landing in between are not counted.
+
+Usage (from the lib directory):
+    python benchmarks/bench_online_migration.py [--freebies 1000000] [--chunk-size 20000] [--pause 0.1]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+import sqlalchemy as sa
+
+import counters
+import database
+import synthetic
+from online_migration import DEFAULT_CHUNK_SIZE, DEFAULT_PAUSE, rebuild_table
+
+WRITE_INTERVAL = 0.005
+
+
+def freebies_elements():
+    """The freebies schema plus a new nullable note column, as rebuild_table() takes it"""
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('dev_id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('note', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id', name='pk_freebies'),
+        sa.ForeignKeyConstraint(['item_id'], ['items.id'], name='fk_freebies_item_id_items'),
+        sa.ForeignKeyConstraint(['dev_id'], ['devs.id'], name='fk_freebies_dev_id_devs'),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], name='fk_freebies_company_id_companies',
+                                ondelete='CASCADE'),
+        sa.Index('ix_freebies_company_id_value', 'company_id', 'value'),
+        sa.Index('ix_freebies_item_id', 'item_id'),
+        sa.Index('ix_freebies_dev_id_item_id', 'dev_id', 'item_id'),
+    ]
+
+
+def batch_rebuild(op):
+    """What a migration does today; batch mode drops the triggers, so they are put back"""
+    with op.batch_alter_table('freebies', recreate='always') as batch_op:
+        batch_op.add_column(sa.Column('note', sa.String(), nullable=True))
+    counters.create_triggers(op.get_bind())
+
+
+def online_rebuild(op):
+    rebuild_table(op, 'freebies', *freebies_elements(), progress=None)
+
+
+def run_migration(url, upgrade, options):
+    """Runs upgrade(op) in one transaction on a NullPool engine, as env.py does; returns the elapsed seconds"""
+    engine = sa.create_engine(url, poolclass=sa.pool.NullPool)
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={'online_migration': options})
+        upgrade(Operations(context))
+        connection.commit()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+def writer(url, stop, latencies):
+    """Inserts one freebie per transaction until stopped, recording commit latency"""
+    # A batch rebuild holds the write lock far longer than the default 5s timeout
+    engine = database.create_configured_engine(url, connect_args={'timeout': 600})
+    insert = sa.text("INSERT INTO freebies (item_id, value, dev_id, company_id) VALUES (1, 100, 1, 1)")
+    while not stop.is_set():
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(insert)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(WRITE_INTERVAL)
+    engine.dispose()
+
+
+def measure(db_path, upgrade, options):
+    url = f'sqlite:///{db_path}'
+    latencies = []
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(url, stop, latencies))
+    thread.start()
+    time.sleep(0.5)
+    warmup = len(latencies)
+    try:
+        seconds = run_migration(url, upgrade, options)
+    finally:
+        stop.set()
+        thread.join()
+    during = sorted(latencies[warmup:])
+
+    engine = database.create_configured_engine(url)
+    with engine.connect() as connection:
+        # Batch mode loses the table's ANALYZE stats, which makes the check crawl
+        connection.exec_driver_sql("ANALYZE freebies")
+        mismatches = counters.check_counters(connection)
+        has_note = 'note' in {column['name'] for column in sa.inspect(connection).get_columns('freebies')}
+    engine.dispose()
+    if not has_note:
+        raise RuntimeError("rebuild did not add the note column")
+
+    return {
+        'seconds': seconds,
+        'writes': len(during),
+        'p50_ms': statistics.median(during) * 1000,
+        'p99_ms': during[int(len(during) * 0.99)] * 1000,
+        'max_ms': during[-1] * 1000,
+        'stale_counters': sum(len(rows) for rows in mismatches.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--freebies', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--pause', type=float, default=DEFAULT_PAUSE, help="Seconds between online chunks")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.db')
+        engine = database.create_configured_engine(f'sqlite:///{source}')
+        elapsed = synthetic.populate(engine, freebies=args.freebies)
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        engine.dispose()
+        print(f"Populated {args.freebies:,} freebies in {elapsed:.1f}s")
+
+        results = {}
+        for label, upgrade in (('batch', batch_rebuild), ('online', online_rebuild)):
+            db_path = os.path.join(tmp, f'{label}.db')
+            shutil.copy(source, db_path)
+            results[label] = measure(db_path, upgrade, {'chunk_size': args.chunk_size, 'pause': args.pause})
+
+    print(f"{'mode':<8} {'total':>9} {'writes':>8} {'p50':>9} {'p99':>10} {'max':>10} {'stale counters':>15}")
+    for label, result in results.items():
+        print(f"{label:<8} {result['seconds']:8.1f}s {result['writes']:8,} {result['p50_ms']:7.1f}ms "
+              f"{result['p99_ms']:8.1f}ms {result['max_ms']:8.1f}ms {result['stale_counters']:15,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Measures read latency while a single writer bulk-loads freebies
+
+Reader threads loop over Company.devs, Dev.companies and
+Company.oldest_company while one writer thread commits batches of freebies,
+as seed.py or load_freebies.py would. Three setups are compared, each on
+its own copy of the same database:
+
+  rollback journal  read-write sessions, journal_mode=DELETE
+  wal               read-write sessions, journal_mode=WAL
+  wal + read pool   database.run_read() on the mode=ro/query_only pool
+
+Usage (from the lib directory):
+    python benchmarks/bench_reads.py [--freebies 200000] [--readers 4] [--seconds 10]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+
+import database
+import synthetic
+from models import Company, Dev
+
+COMPANIES = 100
+DEVS = 10000
+WRITE_INTERVAL = 0.02
+
+
+def company_devs(session, company_id):
+    return len(session.get(Company, company_id).devs)
+
+
+def dev_companies(session, dev_id):
+    return len(session.get(Dev, dev_id).companies)
+
+
+def oldest_company(session, _):
+    return Company.oldest_company(session).id
+
+
+READS = [(company_devs, COMPANIES), (dev_companies, DEVS), (oldest_company, 1)]
+
+
+def direct(fn, arg):
+    """A read on a read-write session in the calling thread, as the models are used today"""
+    with database.session_scope() as session:
+        return fn(session, arg)
+
+
+def pooled(fn, arg):
+    return database.run_read(fn, arg).result()
+
+
+def reader(call, stop, latencies, seed):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        fn, upper = rng.choice(READS)
+        start = time.perf_counter()
+        call(fn, rng.randrange(1, upper + 1))
+        latencies.append(time.perf_counter() - start)
+
+
+def writer(stop, batch_size, written):
+    """One writer committing batch_size freebies per transaction"""
+    insert = text("INSERT INTO freebies (item_id, value, dev_id, company_id) VALUES (1, :value, :dev_id, :company_id)")
+    rng = random.Random(0)
+    while not stop.is_set():
+        rows = [{'value': rng.randrange(100, 1000), 'dev_id': rng.randrange(1, DEVS + 1),
+                 'company_id': rng.randrange(1, COMPANIES + 1)} for _ in range(batch_size)]
+        with database.get_engine().begin() as connection:
+            connection.execute(insert, rows)
+        written[0] += batch_size
+        time.sleep(WRITE_INTERVAL)
+
+
+def measure(call, readers, seconds, batch_size):
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    written = [0]
+    threads = [threading.Thread(target=writer, args=(stop, batch_size, written))]
+    threads += [threading.Thread(target=reader, args=(call, stop, latencies[i], i)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    merged = sorted(latency for per_reader in latencies for latency in per_reader)
+    return {
+        'reads_per_sec': len(merged) / seconds,
+        'p50_ms': statistics.median(merged) * 1000,
+        'p99_ms': merged[int(len(merged) * 0.99)] * 1000,
+        'max_ms': merged[-1] * 1000,
+        'written_per_sec': written[0] / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--freebies', type=int, default=200000)
+    parser.add_argument('--readers', type=int, default=database.READ_POOL_SIZE)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-batch', type=int, default=2000, help="Freebies per write transaction")
+    args = parser.parse_args()
+
+    modes = {
+        'rollback journal': ({**database.SQLITE_PRAGMAS, 'journal_mode': 'DELETE'}, direct),
+        'wal': (None, direct),
+        'wal + read pool': (None, pooled),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.db')
+        engine = database.configure_engine(f'sqlite:///{source}')
+        elapsed = synthetic.populate(engine, companies=COMPANIES, devs=DEVS, freebies=args.freebies)
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"Populated {args.freebies:,} freebies in {elapsed:.1f}s; "
+              f"{args.readers} readers, {args.write_batch:,} freebies per write")
+
+        results = {}
+        for label, (pragmas, call) in modes.items():
+            db_path = os.path.join(tmp, f'{label.replace(" ", "_")}.db')
+            shutil.copy(source, db_path)
+            database.configure_engine(f'sqlite:///{db_path}', pragmas=pragmas)
+            results[label] = measure(call, args.readers, args.seconds, args.write_batch)
+
+    print(f"{'':<18} {'reads/s':>9} {'p50':>9} {'p99':>10} {'max':>10} {'written/s':>10}")
+    for label, result in results.items():
+        print(f"{label:<18} {result['reads_per_sec']:9.0f} {result['p50_ms']:7.1f}ms "
+              f"{result['p99_ms']:8.1f}ms {result['max_ms']:8.1f}ms {result['written_per_sec']:10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
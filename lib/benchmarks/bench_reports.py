@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Compares the SQL rollups in reports.py with summing ORM rows in Python
+
+Usage (from the lib directory):
+    python benchmarks/bench_reports.py [--rows 1000000]
+"""
+
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+import reports
+import synthetic
+from models import Freebie
+
+
+def python_total_value(session):
+    """The previous approach from debug.py and seed.py"""
+    return sum(f.value for f in session.query(Freebie).all())
+
+
+def python_value_by_company(session):
+    """Per-company totals computed from ORM instances"""
+    totals = collections.Counter()
+    for freebie in session.query(Freebie).all():
+        totals[freebie.company_id] += freebie.value
+    return totals
+
+
+def timed(label, fn):
+    session = database.new_session()
+    try:
+        start = time.perf_counter()
+        result = fn(session)
+        elapsed = time.perf_counter() - start
+    finally:
+        session.close()
+    print(f"  {label:<34} {elapsed:8.3f}s")
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        print(f"Generating {args.rows:,} freebies...")
+        synthetic.populate(engine, companies=100, devs=max(100, args.rows // 20), freebies=args.rows)
+
+        print("Total value:")
+        python_seconds, python_total = timed("Python sum over ORM rows", python_total_value)
+        sql_seconds, sql_total = timed("reports.total_value", reports.total_value)
+        assert python_total == sql_total
+        print(f"  speedup: {python_seconds / sql_seconds:.0f}x")
+
+        print("Value per company:")
+        python_seconds, _ = timed("Python grouping over ORM rows", python_value_by_company)
+        sql_seconds, _ = timed("reports.value_by_company", reports.value_by_company)
+        print(f"  speedup: {python_seconds / sql_seconds:.0f}x")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
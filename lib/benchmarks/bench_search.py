@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Compares Freebie.search on items_fts with a LIKE '%...%' scan of item names
+
+LIKE scans every name in the items catalog and stops at the first `limit`
+matching freebies. FTS5 looks up only the matching names and scores each
+distinct name once with bm25, then sorts their freebies by rank, so its
+cost follows the number of matches instead of the catalog size.
+
+Usage (from the lib directory):
+    python benchmarks/bench_search.py [--freebies 1000000] [--calls 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import select
+
+import database
+import synthetic
+from models import Freebie, Item
+
+QUERIES = {
+    'broad': "hoodie",
+    'prefix': "power ba",
+    'selective': "company 97 mug",
+    'no match': "umbrella",
+}
+
+
+def like_search(session, query, limit=20):
+    """The pre-index approach: every word as a substring, no ranking"""
+    statement = select(Freebie).join(Item, Item.id == Freebie.item_id).limit(limit)
+    for word in query.split():
+        statement = statement.where(Item.name.ilike(f'%{word}%'))
+    return session.scalars(statement).all()
+
+
+def time_calls(search, session, query, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        search(query, session)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--freebies', type=int, default=1000000)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        elapsed = synthetic.populate(engine, freebies=args.freebies)
+        print(f"Populated {args.freebies:,} freebies (search index included) in {elapsed:.1f}s")
+
+        session = database.new_session()
+        print(f"{'':<10} {'query':<18} {'matches':>8} {'LIKE scan':>12} {'FTS5':>10} {'speedup':>8}")
+        for label, query in QUERIES.items():
+            matches = len(Freebie.search(query, limit=args.freebies, session=session))
+            like = time_calls(lambda q, s: like_search(s, q), session, query, max(1, args.calls // 20))
+            fts = time_calls(lambda q, s: Freebie.search(q, session=s), session, query, args.calls)
+            print(f"{label:<10} {query!r:<18} {matches:>8,} {like * 1000:10.2f}ms {fts * 1000:8.2f}ms "
+                  f"{like / fts:7.1f}x")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Measures fan-out query time as the same dataset is split over more shards
+
+Each shard is a separate SQLite file holding an equal share of the
+freebies. Speed-up is bounded by the number of CPU cores available.
+
+Usage (from the lib directory):
+    python benchmarks/bench_shards.py [--freebies 400000] [--shards 1 2 4 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+import synthetic
+from shards import ShardMap, ShardedFreebies
+
+
+def timed(label, fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<40} {best * 1000:10.3f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--freebies', type=int, default=400000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s) available")
+    for count in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            urls = {}
+            for index in range(count):
+                url = f"sqlite:///{os.path.join(tmp, f'shard{index}.db')}"
+                engine = database.create_configured_engine(url)
+                synthetic.populate(engine, companies=max(1, 100 // count), devs=max(100, args.freebies // 20 // count),
+                                   freebies=args.freebies // count, seed=index)
+                engine.dispose()
+                urls[f'shard{index}'] = url
+
+            print(f"{count} shard(s), {args.freebies // count:,} freebies each")
+            with ShardedFreebies(ShardMap(urls)) as sharded:
+                # Start the workers and open their engines before timing
+                sharded.total_value()
+                timed("total_value", sharded.total_value)
+                timed("value_by_company", sharded.value_by_company)
+                timed("oldest_company", sharded.oldest_company)
+                timed("dev_companies('Dev 1')", lambda: sharded.dev_companies('Dev 1'))
+
+
+if __name__ == '__main__':
+    main()
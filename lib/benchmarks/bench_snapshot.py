@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Compares FreebieSnapshot queries with the ORM/SQL model methods
+
+Usage (from the lib directory):
+    python benchmarks/bench_snapshot.py [--freebies 1000000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+import reports
+import synthetic
+from models import Company, Dev
+from snapshot import FreebieSnapshot
+
+
+def timed(label, fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<40} {best * 1000:10.3f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--freebies', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.configure_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        print(f"Generating {args.freebies:,} freebies...")
+        synthetic.populate(engine, companies=100, devs=max(100, args.freebies // 20), freebies=args.freebies)
+
+        start = time.perf_counter()
+        snapshot = FreebieSnapshot.load(engine)
+        print(f"  snapshot load from SQLite: {time.perf_counter() - start:.2f}s")
+        path = os.path.join(tmp, 'snapshot')
+        snapshot.save(path)
+        start = time.perf_counter()
+        mapped = FreebieSnapshot.open(path)
+        print(f"  snapshot open (mmap): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        session = database.new_session()
+        company, dev = session.get(Company, 1), session.get(Dev, 1)
+
+        print("Company.devs (busiest company)")
+        timed("ORM Company.devs", lambda: (session.expire_all(), session.get(Company, 1).devs))
+        timed("snapshot.company_devs", lambda: mapped.company_devs(company.id))
+        print("Dev.companies")
+        timed("ORM Dev.companies", lambda: (session.expire_all(), session.get(Dev, 1).companies))
+        timed("snapshot.dev_companies", lambda: mapped.dev_companies(dev.id))
+        print("Value per company")
+        timed("reports.value_by_company (SQL)", lambda: reports.value_by_company(session), repeat=1)
+        timed("snapshot.value_by_company", mapped.value_by_company)
+        print("Devs sharing a company with dev 1")
+        timed("snapshot.co_occurrence", lambda: mapped.co_occurrence(dev.id))
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
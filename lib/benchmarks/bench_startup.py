@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Measures cold-start time of each lib entry point
+
+Every entry point is run as a fresh interpreter against a temporary copy of
+the database migrated to head. Wall time is the best of --runs; import time
+comes from one extra run under python -X importtime and is broken down by
+top-level package.
+
+Usage (from the lib directory):
+    python benchmarks/bench_startup.py [--runs 5] [--output bench_startup.json]
+"""
+
+import argparse
+from collections import defaultdict
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ENTRY_POINTS = {
+    'models.py': ['models.py'],
+    'seed.py': ['seed.py'],
+    'debug.py (smoke test)': ['debug.py', '--no-shell'],
+    'debug.py --skip-tests': ['debug.py', '--skip-tests', '--no-shell'],
+    'delete_company.py --dry-run': ['delete/delete_company.py', '--id', '999', '--dry-run'],
+}
+
+
+def run(args, env, importtime=False):
+    """Runs one entry point and returns (seconds, stderr)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + args
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=LIB_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{completed.stderr}")
+    return elapsed, completed.stderr
+
+
+def import_breakdown(stderr):
+    """Returns {top-level package: self microseconds} from -X importtime output"""
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'freebies.db')
+        shutil.copy(os.path.join(LIB_DIR, 'freebies.db'), db_path)
+        env = {**os.environ, 'FREEBIES_DATABASE_URL': f'sqlite:///{db_path}'}
+        subprocess.run(['alembic', 'upgrade', 'head'], cwd=LIB_DIR, env=env, check=True, capture_output=True)
+        run(['seed.py'], env)
+
+        print(f"{'entry point':<30} {'wall (best)':>12} {'imports':>10}  top packages by import time")
+        for label, entry_args in ENTRY_POINTS.items():
+            wall = min(run(entry_args, env)[0] for _ in range(args.runs))
+            packages = import_breakdown(run(entry_args, env, importtime=True)[1])
+            total_ms = sum(packages.values()) / 1000
+            top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:3]
+            print(f"{label:<30} {wall * 1000:10.0f}ms {total_ms:8.0f}ms  "
+                  + ', '.join(f"{name} {us / 1000:.0f}ms" for name, us in top))
+            results[label] = {
+                'wall_seconds': wall,
+                'import_seconds': total_ms / 1000,
+                'imports_by_package_seconds': {name: us / 1e6 for name, us in top},
+            }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f" Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Read-through cache for hot model lookups
+
+ModelCache sits in front of Company.oldest_company(), name lookups for
+companies and devs, Company.devs and Dev.companies. Results are loaded in a
+short-lived session and stored detached, so a hit issues no SQL at all.
+Without a session argument a hit returns the shared detached instances,
+which is the fastest path and suits read-only callers. With one, each
+object is merged into that session with load=False. This still issues no
+SQL, but merging costs per object, so for long lists it is only slightly
+cheaper than running the query again.
+
+Two stores are provided: LRUCache (in-process, LRU with a TTL) and
+SharedCache, which pickles values into any Redis-style client exposing
+get/set(ex=)/delete/scan_iter. LocalSharedBackend is an in-process stand-in
+for such a client.
+
+Entries are invalidated precisely: changes seen in after_flush (and bulk
+UPDATE/DELETE statements) queue the affected keys, which are dropped on
+after_commit, or forgotten on rollback.
+
+    model_cache = ModelCache(LRUCache(maxsize=1024, ttl=60))
+    model_cache.install()
+    oldest = model_cache.oldest_company(session)
+"""
+
+from collections import OrderedDict
+import pickle
+import threading
+import time
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import attributes
+
+from models import Company, CompanyDev, Dev, Freebie, in_chunks
+from database import SessionLocal, session_scope
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Hit/miss/eviction counters shared by both stores"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value, or _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.stats.invalidations += 1
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+                self.stats.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LocalSharedBackend:
+    """In-process stand-in for a Redis-style client (get/set/delete/scan_iter)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip('*')
+        with self._lock:
+            return [key for key in self._data if key.startswith(prefix)]
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCache:
+    """Stores pickled values in a shared backend, e.g. a redis.Redis client"""
+
+    def __init__(self, backend=None, ttl=300, namespace='freebies:'):
+        self.backend = backend if backend is not None else LocalSharedBackend()
+        self.ttl = ttl
+        self.namespace = namespace
+        self.stats = CacheStats()
+
+    def get(self, key):
+        payload = self.backend.get(self.namespace + key)
+        if payload is None:
+            self.stats.misses += 1
+            return _MISSING
+        self.stats.hits += 1
+        return pickle.loads(payload)
+
+    def set(self, key, value):
+        self.backend.set(self.namespace + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.stats.invalidations += self.backend.delete(*[self.namespace + key for key in keys])
+
+    def delete_prefix(self, prefix):
+        keys = list(self.backend.scan_iter(match=f"{self.namespace}{prefix}*"))
+        if keys:
+            self.stats.invalidations += self.backend.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+def _history_values(obj, attribute):
+    """Returns the current and previous values of attribute on obj"""
+    history = attributes.get_history(obj, attribute)
+    return set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+
+
+class ModelCache:
+    """Read-through cache for the model lookups dashboards call repeatedly"""
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else LRUCache()
+
+    @property
+    def stats(self):
+        return self.store.stats.as_dict()
+
+    def _read_through(self, key, load, session):
+        """Returns the cached value for key, loading and storing it on a miss"""
+        value = self.store.get(key)
+        if value is _MISSING:
+            # Load in a private session so the stored objects are detached
+            with session_scope() as loader:
+                value = load(loader)
+                loader.expunge_all()
+            self.store.set(key, value)
+        if session is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [session.merge(obj, load=False) for obj in value]
+        return session.merge(value, load=False)
+
+    def oldest_company(self, session=None):
+        """Cached Company.oldest_company()"""
+        return self._read_through(
+            'oldest_company',
+            lambda loader: loader.scalars(Company.oldest_company_select()).first(),
+            session,
+        )
+
+    def company_by_name(self, name, session=None):
+        """Cached session.query(Company).filter_by(name=name).first()"""
+        return self._read_through(
+            f'company_by_name:{name}',
+            lambda loader: loader.scalars(
+                select(Company).where(Company.name == name).order_by(Company.id).limit(1)
+            ).first(),
+            session,
+        )
+
+    def dev_by_name(self, name, session=None):
+        """Cached session.query(Dev).filter_by(name=name).first()"""
+        return self._read_through(
+            f'dev_by_name:{name}',
+            lambda loader: loader.scalars(
+                select(Dev).where(Dev.name == name).order_by(Dev.id).limit(1)
+            ).first(),
+            session,
+        )
+
+    def company_devs(self, company, session=None):
+        """Cached Company.devs"""
+        return self._read_through(
+            f'company_devs:{company.id}',
+            lambda loader: loader.scalars(company.devs_select().order_by(Dev.id)).all(),
+            session,
+        )
+
+    def dev_companies(self, dev, session=None):
+        """Cached Dev.companies"""
+        return self._read_through(
+            f'dev_companies:{dev.id}',
+            lambda loader: loader.scalars(dev.companies_select().order_by(Company.id)).all(),
+            session,
+        )
+
+    # Invalidation
+
+    def install(self, session_factory=SessionLocal):
+        """Registers the invalidation listeners on session_factory's sessions"""
+        event.listen(session_factory, 'before_flush', self._before_flush)
+        event.listen(session_factory, 'after_flush', self._after_flush)
+        event.listen(session_factory, 'do_orm_execute', self._on_orm_execute)
+        event.listen(session_factory, 'after_commit', self._after_commit)
+        event.listen(session_factory, 'after_rollback', self._after_rollback)
+
+    def uninstall(self, session_factory=SessionLocal):
+        event.remove(session_factory, 'before_flush', self._before_flush)
+        event.remove(session_factory, 'after_flush', self._after_flush)
+        event.remove(session_factory, 'do_orm_execute', self._on_orm_execute)
+        event.remove(session_factory, 'after_commit', self._after_commit)
+        event.remove(session_factory, 'after_rollback', self._after_rollback)
+
+    @staticmethod
+    def _pending(session):
+        """Keys and prefixes waiting for this session's commit"""
+        return session.info.setdefault('model_cache_pending', (set(), set()))
+
+    def _before_flush(self, session, flush_context, instances):
+        """Deleting a company cascades to its freebies in SQL, out of the ORM's
+        sight, so its devs are looked up while company_devs still lists them"""
+        company_ids = [obj.id for obj in session.deleted if isinstance(obj, Company)]
+        if not company_ids:
+            return
+        keys, _ = self._pending(session)
+        for chunk in in_chunks(set(company_ids)):
+            keys.update(f'dev_companies:{dev_id}' for dev_id in session.scalars(
+                select(CompanyDev.dev_id).where(CompanyDev.company_id.in_(chunk))
+            ))
+
+    def _after_flush(self, session, flush_context):
+        keys, _ = self._pending(session)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Freebie):
+                # Old and new owners both change, so look at the attribute history
+                keys.update(f'company_devs:{company_id}' for company_id in _history_values(obj, 'company_id'))
+                keys.update(f'dev_companies:{dev_id}' for dev_id in _history_values(obj, 'dev_id'))
+            elif isinstance(obj, Company):
+                if obj in session.new or obj in session.deleted or \
+                        inspect(obj).attrs.founding_year.history.has_changes():
+                    keys.add('oldest_company')
+                keys.update(f'company_by_name:{name}' for name in _history_values(obj, 'name'))
+                keys.add(f'company_devs:{obj.id}')
+            elif isinstance(obj, Dev):
+                keys.update(f'dev_by_name:{name}' for name in _history_values(obj, 'name'))
+                keys.add(f'dev_companies:{obj.id}')
+
+    def _on_orm_execute(self, orm_execute_state):
+        """Bulk UPDATE/DELETE bypasses the flush, so drop whole key families"""
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        _, prefixes = self._pending(orm_execute_state.session)
+        for mapper in orm_execute_state.all_mappers:
+            if mapper.class_ is Freebie:
+                prefixes.update({'company_devs:', 'dev_companies:'})
+            elif mapper.class_ is Company:
+                prefixes.update({'oldest_company', 'company_by_name:', 'company_devs:', 'dev_companies:'})
+            elif mapper.class_ is Dev:
+                prefixes.update({'dev_by_name:', 'dev_companies:'})
+
+    def _after_commit(self, session):
+        keys, prefixes = session.info.pop('model_cache_pending', (set(), set()))
+        if keys:
+            self.store.delete(*keys)
+        for prefix in prefixes:
+            self.store.delete_prefix(prefix)
+
+    def _after_rollback(self, session):
+        session.info.pop('model_cache_pending', None)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Denormalized freebie counters on companies, devs and company_devs
+
+SQLite triggers on the freebies table keep these columns current for every
+write path: ORM flushes, bulk UPDATEs from transfer_freebies(), the bulk
+loader's executemany and cascaded company deletes.
+
+    companies.freebie_count, total_value, distinct_dev_count
+    devs.freebie_count, total_value, distinct_company_count
+    company_devs(company_id, dev_id, freebie_count)   one row per pair
+
+Usage (from the lib directory):
+    python counters.py            check the counters against freebies
+    python counters.py --rebuild  reinstall the triggers and recompute every counter
+"""
+
+import argparse
+
+from sqlalchemy import text
+
+from database import get_engine
+
+# Statements applied when a freebie row arrives (NEW) or leaves (OLD). An
+# UPDATE that moves a freebie is an OLD removal followed by a NEW arrival.
+# The distinct counters change only when a (company, dev) pair gains its
+# first freebie or loses its last. That is checked against freebies itself
+# rather than company_devs, whose rows a company delete may already have
+# cascaded away before these triggers run. Excluding the row's own id makes
+# an UPDATE that keeps the pair net out to zero. The unary + keeps SQLite
+# off the company_id index, since one big company can own most rows; a dev
+# holds few freebies, so the (dev_id, item_id) index is the cheap probe.
+_NEW_PAIR_IS_FIRST = """NOT EXISTS (
+    SELECT 1 FROM freebies
+    WHERE +company_id = NEW.company_id AND dev_id = NEW.dev_id AND id != NEW.id)"""
+
+_OLD_PAIR_IS_EMPTY = """NOT EXISTS (
+    SELECT 1 FROM freebies
+    WHERE +company_id = OLD.company_id AND dev_id = OLD.dev_id AND id != OLD.id)"""
+
+_ARRIVE = f"""
+    UPDATE companies SET
+        freebie_count = freebie_count + 1,
+        total_value = total_value + NEW.value,
+        distinct_dev_count = distinct_dev_count + {_NEW_PAIR_IS_FIRST}
+    WHERE id = NEW.company_id;
+    UPDATE devs SET
+        freebie_count = freebie_count + 1,
+        total_value = total_value + NEW.value,
+        distinct_company_count = distinct_company_count + {_NEW_PAIR_IS_FIRST}
+    WHERE id = NEW.dev_id;
+    INSERT INTO company_devs (company_id, dev_id, freebie_count) VALUES (NEW.company_id, NEW.dev_id, 1)
+    ON CONFLICT (company_id, dev_id) DO UPDATE SET freebie_count = freebie_count + 1;
+"""
+
+_LEAVE = f"""
+    UPDATE companies SET
+        freebie_count = freebie_count - 1,
+        total_value = total_value - OLD.value,
+        distinct_dev_count = distinct_dev_count - {_OLD_PAIR_IS_EMPTY}
+    WHERE id = OLD.company_id;
+    UPDATE devs SET
+        freebie_count = freebie_count - 1,
+        total_value = total_value - OLD.value,
+        distinct_company_count = distinct_company_count - {_OLD_PAIR_IS_EMPTY}
+    WHERE id = OLD.dev_id;
+    UPDATE company_devs SET freebie_count = freebie_count - 1
+    WHERE company_id = OLD.company_id AND dev_id = OLD.dev_id;
+    DELETE FROM company_devs
+    WHERE company_id = OLD.company_id AND dev_id = OLD.dev_id AND freebie_count <= 0;
+"""
+
+TRIGGERS = {
+    'trg_freebies_counters_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_freebies_counters_insert AFTER INSERT ON freebies
+        BEGIN {_ARRIVE} END
+    """,
+    'trg_freebies_counters_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_freebies_counters_delete AFTER DELETE ON freebies
+        BEGIN {_LEAVE} END
+    """,
+    'trg_freebies_counters_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_freebies_counters_update
+        AFTER UPDATE OF dev_id, company_id, value ON freebies
+        BEGIN {_LEAVE} {_ARRIVE} END
+    """,
+}
+
+# Recomputes every counter from freebies; used by the backfill and --rebuild
+REBUILD_STATEMENTS = [
+    "DELETE FROM company_devs",
+    """
+    INSERT INTO company_devs (company_id, dev_id, freebie_count)
+    SELECT company_id, dev_id, COUNT(*) FROM freebies GROUP BY company_id, dev_id
+    """,
+    """
+    UPDATE companies SET
+        freebie_count = COALESCE((SELECT COUNT(*) FROM freebies WHERE company_id = companies.id), 0),
+        total_value = COALESCE((SELECT SUM(value) FROM freebies WHERE company_id = companies.id), 0),
+        distinct_dev_count = (SELECT COUNT(*) FROM company_devs WHERE company_id = companies.id)
+    """,
+    """
+    UPDATE devs SET
+        freebie_count = COALESCE((SELECT SUM(freebie_count) FROM company_devs WHERE dev_id = devs.id), 0),
+        total_value = COALESCE((SELECT SUM(value) FROM freebies WHERE dev_id = devs.id), 0),
+        distinct_company_count = (SELECT COUNT(*) FROM company_devs WHERE dev_id = devs.id)
+    """,
+]
+
+# Each query returns the rows whose stored counters disagree with freebies
+CONSISTENCY_CHECKS = {
+    'companies': """
+        SELECT c.id, c.freebie_count, c.total_value, c.distinct_dev_count,
+               COUNT(f.id), COALESCE(SUM(f.value), 0), COUNT(DISTINCT f.dev_id)
+        FROM companies c LEFT JOIN freebies f ON f.company_id = c.id
+        GROUP BY c.id
+        HAVING c.freebie_count != COUNT(f.id)
+            OR c.total_value != COALESCE(SUM(f.value), 0)
+            OR c.distinct_dev_count != COUNT(DISTINCT f.dev_id)
+    """,
+    'devs': """
+        SELECT d.id, d.freebie_count, d.total_value, d.distinct_company_count,
+               COUNT(f.id), COALESCE(SUM(f.value), 0), COUNT(DISTINCT f.company_id)
+        FROM devs d LEFT JOIN freebies f ON f.dev_id = d.id
+        GROUP BY d.id
+        HAVING d.freebie_count != COUNT(f.id)
+            OR d.total_value != COALESCE(SUM(f.value), 0)
+            OR d.distinct_company_count != COUNT(DISTINCT f.company_id)
+    """,
+    'company_devs': """
+        SELECT f.company_id, f.dev_id, p.freebie_count, f.freebie_count
+        FROM (SELECT company_id, dev_id, COUNT(*) AS freebie_count
+              FROM freebies GROUP BY company_id, dev_id) f
+        LEFT JOIN company_devs p ON p.company_id = f.company_id AND p.dev_id = f.dev_id
+        WHERE p.freebie_count IS NOT f.freebie_count
+        UNION ALL
+        SELECT p.company_id, p.dev_id, p.freebie_count, 0
+        FROM company_devs p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM freebies WHERE company_id = p.company_id AND dev_id = p.dev_id)
+    """,
+}
+
+
+def create_triggers(connection):
+    """Creates the counter triggers on freebies if they are missing"""
+    for ddl in TRIGGERS.values():
+        connection.execute(text(ddl))
+
+
+def drop_triggers(connection):
+    for name in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def rebuild_counters(connection):
+    """Recomputes every counter and company_devs row from freebies"""
+    for statement in REBUILD_STATEMENTS:
+        connection.execute(text(statement))
+
+
+def check_counters(connection):
+    """Returns {table: [mismatched rows]} for counters that disagree with freebies"""
+    mismatches = {}
+    for table, query in CONSISTENCY_CHECKS.items():
+        rows = connection.execute(text(query)).fetchall()
+        if rows:
+            mismatches[table] = rows
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rebuild', action='store_true', help="Reinstall the triggers and recompute all counters")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.rebuild:
+        with engine.begin() as connection:
+            drop_triggers(connection)
+            create_triggers(connection)
+            rebuild_counters(connection)
+        print(" Triggers reinstalled and counters rebuilt")
+
+    with engine.connect() as connection:
+        mismatches = check_counters(connection)
+    if not mismatches:
+        print(" All counters are consistent")
+    for table, rows in mismatches.items():
+        print(f" {table}: {len(rows)} rows out of date (first: {rows[0]})")
+    if mismatches:
+        print(" Run 'python counters.py --rebuild' to fix them")
+        exit(1)
@@ -1,17 +1,16 @@
 #!/usr/bin/env python3
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Company, Dev, Freebie
+from models import Company, Dev, Freebie, render_details
+from database import DATABASE_URL, Session
+from sqlalchemy import make_url
+import reports
+import argparse
 import os
 
 def test_relationships_and_methods():
     """Test all the relationships and methods with the seed data"""
     
-    # Fix the database path - use absolute path to freebies.db in current directory
-    db_path = os.path.join(os.path.dirname(__file__), 'freebies.db')
-    engine = create_engine(f'sqlite:///{db_path}')
-    Session = sessionmaker(bind=engine)
+    # Thread-local session from the shared registry in database.py
     session = Session()
     
     print("=" * 60)
@@ -27,7 +26,6 @@ def test_relationships_and_methods():
         if company_count == 0 or dev_count == 0 or freebie_count == 0:
             print(" No data found in database!")
             print("Please run: python seed.py first")
-            session.close()
             return
         
         print(f"Database contains: {company_count} companies, {dev_count} devs, {freebie_count} freebies")
@@ -43,7 +41,6 @@ def test_relationships_and_methods():
         
         if not all([raila, ruto, rigachi, odm, uda, dcp]):
             print(" Expected data not found! Please run: python seed.py")
-            session.close()
             return
         
         print("\n1. TESTING BASIC RELATIONSHIPS")
@@ -85,15 +82,15 @@ def test_relationships_and_methods():
         
         # Test Freebie.print_details()
         print("Testing Freebie.print_details():")
-        for freebie in session.query(Freebie).limit(3):
-            print(f"  {freebie.print_details()}")
+        for line in render_details(session.query(Freebie).order_by(Freebie.id).limit(3)):
+            print(f"  {line}")
         
         print("\n3. TESTING COMPANY METHODS")
         print("-" * 40)
         
         # Test Company.oldest_company()
         print("Testing Company.oldest_company():")
-        oldest = Company.oldest_company()
+        oldest = Company.oldest_company(session)
         if oldest:
             print(f"  Oldest company: {oldest.name} (founded {oldest.founding_year})")
         
@@ -107,7 +104,21 @@ def test_relationships_and_methods():
         print(f"  Ruto received 'Wheelbarrow': {ruto.received_one('Wheelbarrow')}")
         print(f"  Ruto received 'ODM T-shirts': {ruto.received_one('ODM T-shirts')}")
         
-        print("\n5. TESTING AGGREGATE DATA")
+        print("\n5. TESTING ITEM NAME FILTERS")
+        print("-" * 40)
+        
+        # Freebie.item_name filters run on item_id; != must also match names not in items
+        equal = session.query(Freebie).filter(Freebie.item_name == "ODM T-shirts").count()
+        not_equal = session.query(Freebie).filter(Freebie.item_name != "ODM T-shirts").count()
+        unknown = session.query(Freebie).filter(Freebie.item_name != "No such item").count()
+        listed = session.query(Freebie).filter(Freebie.item_name.in_(["ODM T-shirts", "Laptop"])).count()
+        print(f"  item_name == 'ODM T-shirts': {equal}")
+        print(f"  item_name != 'ODM T-shirts': {not_equal} (expected {freebie_count - equal})")
+        print(f"  item_name != 'No such item': {unknown} (expected {freebie_count})")
+        print(f"  item_name in ['ODM T-shirts', 'Laptop']: {listed} (expected {equal})")
+        print(f"  Names: {[name for (name,) in session.query(Freebie.item_name).order_by(Freebie.id)]}")
+        
+        print("\n6. TESTING AGGREGATE DATA")
         print("-" * 40)
         
         # Show summary statistics
@@ -120,11 +131,11 @@ def test_relationships_and_methods():
         print(f"Total freebies: {total_freebies}")
         
         # Show value statistics
-        total_value = sum(f.value for f in session.query(Freebie).all())
+        total_value = reports.total_value(session)
         print(f"Total value of all freebies: KSh {total_value:,}")
         
         # Show most valuable freebie
-        most_valuable = session.query(Freebie).order_by(Freebie.value.desc()).first()
+        most_valuable = next(iter(reports.top_freebies(1, session)), None)
         if most_valuable:
             print(f"Most valuable freebie: {most_valuable.item_name} (KSh {most_valuable.value:,})")
         
@@ -135,21 +146,31 @@ def test_relationships_and_methods():
     except Exception as e:
         print(f" Error during testing: {e}")
     finally:
-        session.close()
+        Session.remove()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the relationship smoke test, then open a debugger")
+    parser.add_argument('--skip-tests', action='store_true',
+                        default=os.environ.get('FREEBIES_SKIP_SMOKE_TEST') == '1',
+                        help="Go straight to the shell (or set FREEBIES_SKIP_SMOKE_TEST=1)")
+    parser.add_argument('--no-shell', action='store_true', help="Exit after the tests")
+    args = parser.parse_args()
+
     # Check if database exists
-    db_path = os.path.join(os.path.dirname(__file__), 'freebies.db')
+    db_path = make_url(DATABASE_URL).database
     
-    if not os.path.exists(db_path):
-        print(" Database file 'freebies.db' not found!")
+    if not db_path or not os.path.exists(db_path):
+        print(f" Database file '{db_path}' not found!")
         print("Please run the following commands first:")
         print("1. alembic upgrade head")
         print("2. python seed.py")
         exit(1)
     
     # Run the tests first
-    test_relationships_and_methods()
+    if not args.skip_tests:
+        test_relationships_and_methods()
+    if args.no_shell:
+        exit(0)
     
     # Then start the interactive session
     print("\nStarting interactive debug session...")
@@ -159,8 +180,6 @@ if __name__ == '__main__':
     print("  print(raila.freebies)")
     print("\n" + "-" * 60)
     
-    engine = create_engine(f'sqlite:///{db_path}')
-    Session = sessionmaker(bind=engine)
     session = Session()
     
     # Make some common objects available in the debug session
@@ -178,4 +197,9 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"Warning: Could not pre-load objects: {e}")
     
-    import ipdb; ipdb.set_trace()
\ No newline at end of file
+    # Imported only now: ipdb is slow to import and optional
+    try:
+        import ipdb as debugger
+    except ImportError:
+        import pdb as debugger
+    debugger.set_trace()
\ No newline at end of file
@@ -1,57 +1,151 @@
 #!/usr/bin/env python3
+"""Purges companies and their freebies without holding the database lock
 
-import sqlite3
+Companies are selected by id, name and/or founding year. Their freebies are
+deleted in bounded rowid ranges, one short transaction per chunk, so readers
+get the database back between chunks; the companies themselves go last.
+
+Usage (from the lib directory):
+    python delete/delete_company.py --id 4 --name "Test Company" --dry-run
+    python delete/delete_company.py --founded-before 1990 --chunk-size 5000
+"""
+
+import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import and_, delete, func, or_, select
+
+from models import Company, Freebie, IN_CHUNK_SIZE, in_chunks
+from database import get_engine
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def company_filter(ids=None, names=None, where=None):
+    """Builds the WHERE clause for the companies to purge
+
+    ids and names are alternatives (a company matching either is selected);
+    where is an extra SQL expression on Company that must also hold.
+    """
+    matches = []
+    if ids:
+        matches.append(Company.id.in_(list(ids)))
+    if names:
+        matches.append(Company.name.in_(list(names)))
+
+    clauses = []
+    if matches:
+        clauses.append(or_(*matches))
+    if where is not None:
+        clauses.append(where)
+    if not clauses:
+        raise ValueError("Refusing to purge every company: give ids, names or a predicate")
+    return and_(*clauses)
+
+
+def count_purge(criteria, engine=None):
+    """Returns (companies, freebies, total_value) a purge would remove, in one query"""
+    engine = engine or get_engine()
+    query = (
+        select(
+            func.count(func.distinct(Company.id)),
+            func.count(Freebie.id),
+            func.coalesce(func.sum(Freebie.value), 0),
+        )
+        .select_from(Company)
+        .outerjoin(Freebie, Freebie.company_id == Company.id)
+        .where(criteria)
+    )
+    with engine.connect() as connection:
+        return tuple(connection.execute(query).one())
+
+
+def purge_companies(criteria, engine=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Deletes the companies matching criteria and all of their freebies
+
+    Freebies are removed chunk_size at a time, each chunk a rowid range in
+    its own transaction. progress, if given, is called as
+    progress(freebies_deleted) after each chunk. Returns
+    (companies_deleted, freebies_deleted).
+    """
+    engine = engine or get_engine()
+    with engine.connect() as connection:
+        company_ids = list(connection.execute(select(Company.id).where(criteria)).scalars())
+    if not company_ids:
+        return 0, 0
+
+    freebies_deleted = 0
+    with engine.connect() as connection:
+        for company_chunk in in_chunks(company_ids, IN_CHUNK_SIZE):
+            owned = Freebie.company_id.in_(company_chunk)
+            last_id = 0
+            while True:
+                with connection.begin():
+                    ids = connection.execute(
+                        select(Freebie.id)
+                        .where(owned, Freebie.id > last_id)
+                        .order_by(Freebie.id)
+                        .limit(chunk_size)
+                    ).scalars().all()
+                    if not ids:
+                        break
+                    result = connection.execute(
+                        delete(Freebie).where(owned, Freebie.id.between(ids[0], ids[-1]))
+                    )
+                freebies_deleted += result.rowcount
+                last_id = ids[-1]
+                if progress:
+                    progress(freebies_deleted)
+
+        companies_deleted = 0
+        for company_chunk in in_chunks(company_ids, IN_CHUNK_SIZE):
+            with connection.begin():
+                result = connection.execute(delete(Company).where(Company.id.in_(company_chunk)))
+                companies_deleted += result.rowcount
+
+    return companies_deleted, freebies_deleted
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--id', type=int, action='append', dest='ids', help="Company id (repeatable)")
+    parser.add_argument('--name', action='append', dest='names', help="Company name (repeatable)")
+    parser.add_argument('--founded-before', type=int, help="Only companies founded before this year")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Report counts without deleting")
+    return parser.parse_args(argv)
+
+
+def delete_company(argv=None):
+    """Command-line entry point"""
+    args = parse_args(argv)
+    where = Company.founding_year < args.founded_before if args.founded_before else None
 
-def delete_company():
-    """Delete company with id=4 and name='Test Company' using SQLite3"""
-    
-    # Path to database (go up one level to lib folder)
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'freebies.db')
-    
     try:
-        # Connect to database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        print("Checking for company with ID=4 and name='Test Company'...")
-        
-        # Check if company exists
-        cursor.execute("SELECT * FROM companies WHERE id = 4 AND name = 'Test Company'")
-        company = cursor.fetchone()
-        
-        if not company:
-            print(" Company with ID=4 and name 'Test Company' not found")
-            return
-        
-        print(f" Found company: ID={company[0]}, Name='{company[1]}', Founded={company[2]}")
-        
-        # Check for related freebies
-        cursor.execute("SELECT COUNT(*) FROM freebies WHERE company_id = 4")
-        freebie_count = cursor.fetchone()[0]
-        
-        if freebie_count > 0:
-            print(f"  Company has {freebie_count} related freebies. Deleting them first...")
-            cursor.execute("DELETE FROM freebies WHERE company_id = 4")
-            print(f" Deleted {cursor.rowcount} freebies")
-        
-        # Delete the company
-        cursor.execute("DELETE FROM companies WHERE id = 4 AND name = 'Test Company'")
-        
-        if cursor.rowcount > 0:
-            conn.commit()
-            print(" Successfully deleted 'Test Company' with ID=4")
-        else:
-            print(" No company was deleted")
-            
-    except sqlite3.Error as e:
-        print(f" Database error: {e}")
-        conn.rollback()
-    except Exception as e:
-        print(f" Error: {e}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+        criteria = company_filter(args.ids, args.names, where)
+    except ValueError as e:
+        print(f" {e}")
+        return
+
+    companies, freebies, total_value = count_purge(criteria)
+    if not companies:
+        print(" No matching companies found")
+        return
+    print(f" Matched {companies} companies with {freebies} freebies worth KSh {total_value:,}")
+    if args.dry_run:
+        print(" Dry run: nothing deleted")
+        return
+
+    companies, freebies = purge_companies(
+        criteria,
+        chunk_size=args.chunk_size,
+        progress=lambda deleted: print(f"  {deleted:,} freebies deleted..."),
+    )
+    print(f" Successfully deleted {companies} companies and {freebies} freebies")
+
 
 if __name__ == "__main__":
-    delete_company()
\ No newline at end of file
+    delete_company()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Change-data-capture feed of freebie ownership events
+
+SQLite triggers on freebies append one row to freebie_events per change,
+in the same transaction as the change. That covers every write path, as
+for the counters: ORM flushes, transfer_freebies() bulk UPDATEs,
+load_freebies.py and cascaded company deletes.
+
+    create    a freebie was given:   to_dev_id is its dev
+    transfer  it changed hands:      from_dev_id -> to_dev_id
+    delete    it is gone:            from_dev_id was its last dev
+
+Each event also carries the freebie's company_id, item_id and value, so a
+consumer can mirror freebies from the feed alone. seq is AUTOINCREMENT,
+and SQLite has one writer at a time, so events become visible in seq order
+with no gaps. A consumer that tails the feed from its checkpoint therefore
+does work in proportion to the changes, not to the table:
+
+    consumer = EventConsumer('search-mirror')
+    for batch in consumer.batches():
+        apply(batch)            # the checkpoint moves past batch afterwards
+
+To start a mirror, copy freebies and record latest_seq() in the same read
+transaction, then seek() the consumer there.
+
+Usage (from the lib directory):
+    python events.py tail [--after 0] [--limit 20]
+    python events.py consumers
+    python events.py compact [--older-than-days 30]
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from database import get_engine
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COMPACT_CHUNK_SIZE = 50000
+
+_APPEND = """
+    INSERT INTO freebie_events (kind, freebie_id, company_id, item_id, value, from_dev_id, to_dev_id)
+    VALUES ('{kind}', {row}.id, {row}.company_id, {row}.item_id, {row}.value, {from_dev}, {to_dev});
+"""
+
+TRIGGERS = {
+    'trg_freebies_events_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_freebies_events_insert AFTER INSERT ON freebies
+        BEGIN {_APPEND.format(kind='create', row='NEW', from_dev='NULL', to_dev='NEW.dev_id')} END
+    """,
+    'trg_freebies_events_transfer': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_freebies_events_transfer AFTER UPDATE OF dev_id ON freebies
+        WHEN OLD.dev_id IS NOT NEW.dev_id
+        BEGIN {_APPEND.format(kind='transfer', row='NEW', from_dev='OLD.dev_id', to_dev='NEW.dev_id')} END
+    """,
+    'trg_freebies_events_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_freebies_events_delete AFTER DELETE ON freebies
+        BEGIN {_APPEND.format(kind='delete', row='OLD', from_dev='OLD.dev_id', to_dev='NULL')} END
+    """,
+}
+
+EVENT_COLUMNS = "seq, kind, freebie_id, company_id, item_id, value, from_dev_id, to_dev_id, recorded_at"
+
+
+class EventsCompactedError(RuntimeError):
+    """A consumer's checkpoint is behind events that compaction has deleted
+
+    The consumer has missed changes and must rebuild from a fresh copy of
+    freebies before seeking to latest_seq().
+    """
+
+
+def create_triggers(connection):
+    """Creates the event triggers on freebies if they are missing"""
+    for ddl in TRIGGERS.values():
+        connection.execute(text(ddl))
+
+
+def drop_triggers(connection):
+    for name in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def append_create_events(connection, after_id):
+    """Appends a create event, in id order, for every freebie with id > after_id
+
+    For loads that ran with the event triggers dropped; one INSERT ... SELECT
+    instead of one trigger firing per row.
+    """
+    connection.execute(text("""
+        INSERT INTO freebie_events (kind, freebie_id, company_id, item_id, value, from_dev_id, to_dev_id)
+        SELECT 'create', id, company_id, item_id, value, NULL, dev_id
+        FROM freebies WHERE id > :after ORDER BY id
+    """), {'after': after_id})
+
+
+def latest_seq(connection):
+    """The highest seq ever assigned, whether or not compaction has removed it"""
+    return connection.execute(text(
+        "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'freebie_events'), 0)"
+    )).scalar()
+
+
+def read_events(connection, after_seq, limit=DEFAULT_BATCH_SIZE):
+    """Returns up to limit events with seq > after_seq, oldest first
+
+    Raises EventsCompactedError when events right after after_seq have
+    been compacted away.
+    """
+    rows = connection.execute(
+        text(f"SELECT {EVENT_COLUMNS} FROM freebie_events WHERE seq > :after ORDER BY seq LIMIT :limit"),
+        {'after': after_seq, 'limit': limit},
+    ).all()
+    # seqs have no gaps, so a jump past after_seq + 1 means compaction
+    first = rows[0].seq if rows else latest_seq(connection) + 1
+    if first > after_seq + 1:
+        raise EventsCompactedError(f"events {after_seq + 1}..{first - 1} were compacted")
+    return rows
+
+
+def checkpoints(connection):
+    """Returns (consumer, last_seq, updated_at) for every consumer"""
+    return connection.execute(
+        text("SELECT consumer, last_seq, updated_at FROM event_checkpoints ORDER BY consumer")).all()
+
+
+class EventConsumer:
+    """Tails freebie_events from a checkpoint saved under name
+
+    Delivery is at-least-once: the checkpoint moves past a batch only when
+    the caller asks for the next one, so a consumer that crashes mid-batch
+    sees that batch again.
+    """
+
+    def __init__(self, name, engine=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.name = name
+        self.engine = engine or get_engine()
+        self.batch_size = batch_size
+
+    @property
+    def position(self):
+        """The last seq processed, 0 for a new consumer"""
+        with self.engine.connect() as connection:
+            return connection.execute(
+                text("SELECT last_seq FROM event_checkpoints WHERE consumer = :name"), {'name': self.name}
+            ).scalar() or 0
+
+    def seek(self, seq, connection=None):
+        """Moves the checkpoint to seq, creating it if needed"""
+        statement = text("""
+            INSERT INTO event_checkpoints (consumer, last_seq, updated_at)
+            VALUES (:name, :seq, CURRENT_TIMESTAMP)
+            ON CONFLICT (consumer) DO UPDATE SET last_seq = excluded.last_seq, updated_at = excluded.updated_at
+        """)
+        if connection is not None:
+            connection.execute(statement, {'name': self.name, 'seq': seq})
+            return
+        with self.engine.begin() as connection:
+            connection.execute(statement, {'name': self.name, 'seq': seq})
+
+    def batches(self, limit=None):
+        """Yields lists of new events until caught up, saving the checkpoint after each
+
+        limit caps the number of batches in one call.
+        """
+        position = self.position
+        delivered = 0
+        while limit is None or delivered < limit:
+            with self.engine.connect() as connection:
+                batch = read_events(connection, position, self.batch_size)
+            if not batch:
+                return
+            yield batch
+            delivered += 1
+            position = batch[-1].seq
+            self.seek(position)
+
+    def lag(self):
+        """How many seqs the consumer is behind the newest event"""
+        with self.engine.connect() as connection:
+            return latest_seq(connection) - self.position
+
+
+def compact_events(engine=None, up_to=None, older_than=None, chunk_size=DEFAULT_COMPACT_CHUNK_SIZE):
+    """Deletes old events in seq chunks, one short transaction each; returns how many
+
+    By default only events every consumer has processed are deleted, up to
+    the lowest checkpoint, and nothing is deleted while there are no
+    consumers. up_to raises the bound to a seq. older_than, a timedelta,
+    raises it to the last event recorded before that age. A consumer
+    overtaken this way gets EventsCompactedError on its next read.
+    """
+    engine = engine or get_engine()
+    with engine.connect() as connection:
+        bound = connection.execute(text("SELECT MIN(last_seq) FROM event_checkpoints")).scalar() or 0
+        if up_to is not None:
+            bound = max(bound, up_to)
+        if older_than is not None:
+            cutoff = (datetime.now(timezone.utc) - older_than).strftime('%Y-%m-%d %H:%M:%S')
+            # recorded_at grows with seq, so this stops at the first newer event
+            newer = connection.execute(
+                text("SELECT seq FROM freebie_events WHERE recorded_at >= :cutoff ORDER BY seq LIMIT 1"),
+                {'cutoff': cutoff},
+            ).scalar()
+            bound = max(bound, (newer - 1) if newer is not None else latest_seq(connection))
+        low = connection.execute(text("SELECT MIN(seq) FROM freebie_events")).scalar()
+
+    deleted = 0
+    if low is None:
+        return deleted
+    low -= 1
+    while low < bound:
+        high = min(low + chunk_size, bound)
+        with engine.begin() as connection:
+            deleted += connection.execute(
+                text("DELETE FROM freebie_events WHERE seq > :low AND seq <= :high"), {'low': low, 'high': high}
+            ).rowcount
+        low = high
+    return deleted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    tail = subparsers.add_parser('tail', help="Print events after a seq")
+    tail.add_argument('--after', type=int, default=0)
+    tail.add_argument('--limit', type=int, default=20)
+    subparsers.add_parser('consumers', help="List consumer checkpoints and lag")
+    compact = subparsers.add_parser('compact', help="Delete events every consumer has processed")
+    compact.add_argument('--older-than-days', type=float,
+                         help="Also delete events older than this, processed or not")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == 'tail':
+        with engine.connect() as connection:
+            for event in read_events(connection, args.after, args.limit):
+                moved = f"{event.from_dev_id or '-'} -> {event.to_dev_id or '-'}"
+                print(f"  {event.seq:>8} {event.recorded_at} {event.kind:<8} freebie {event.freebie_id} "
+                      f"dev {moved} company {event.company_id} value {event.value}")
+    elif args.command == 'consumers':
+        with engine.connect() as connection:
+            latest = latest_seq(connection)
+            rows = checkpoints(connection)
+        if not rows:
+            print(" No consumers")
+        for consumer, last_seq, updated_at in rows:
+            print(f"  {consumer}: at seq {last_seq:,} of {latest:,} ({latest - last_seq:,} behind), "
+                  f"updated {updated_at}")
+    else:
+        older_than = timedelta(days=args.older_than_days) if args.older_than_days is not None else None
+        deleted = compact_events(engine, older_than=older_than)
+        print(f" Compacted {deleted:,} events")
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Streams the freebie ledger to CSV, JSONL or Parquet in constant memory
+
+One joined SELECT over freebies, devs and companies is read chunk_size rows
+at a time and each chunk is written out before the next is fetched, so
+memory use does not grow with the size of the ledger.
+
+Usage (from the lib directory):
+    python export_ledger.py ledger.csv
+    python export_ledger.py ledger.parquet --company ODM --min-value 1000
+    python export_ledger.py ledger.jsonl --dev Raila --dev Ruto
+
+Parquet output requires pyarrow.
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import time
+
+from sqlalchemy import select
+
+from models import Company, Dev, Freebie, Item
+from database import SQLITE_PRAGMAS, get_engine
+from load_freebies import print_progress
+
+DEFAULT_CHUNK_SIZE = 10000
+LEDGER_COLUMNS = ('freebie_id', 'item_name', 'value', 'dev', 'company', 'founding_year')
+
+# A single pass gains nothing from the page cache or mmap, and both would
+# otherwise count towards RSS for as much of the file as the scan touches
+EXPORT_PRAGMAS = {
+    'cache_size': -2000,
+    'mmap_size': 0,
+}
+
+
+def ledger_select(companies=None, devs=None, min_value=None, max_value=None):
+    """Core SELECT of ledger rows in freebie id order, optionally filtered"""
+    statement = (
+        select(
+            Freebie.id, Item.name, Freebie.value,
+            Dev.name, Company.name, Company.founding_year,
+        )
+        .join(Item, Item.id == Freebie.item_id)
+        .join(Dev, Dev.id == Freebie.dev_id)
+        .join(Company, Company.id == Freebie.company_id)
+        .order_by(Freebie.id)
+    )
+    if companies:
+        statement = statement.where(Company.name.in_(companies))
+    if devs:
+        statement = statement.where(Dev.name.in_(devs))
+    if min_value is not None:
+        statement = statement.where(Freebie.value >= min_value)
+    if max_value is not None:
+        statement = statement.where(Freebie.value <= max_value)
+    return statement
+
+
+class CsvLedgerWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(LEDGER_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlLedgerWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(dict(zip(LEDGER_COLUMNS, row))) + '\n' for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetLedgerWriter:
+    """Writes each chunk as a Parquet row group"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from None
+        self.pa = pa
+        self.schema = pa.schema([
+            ('freebie_id', pa.int64()),
+            ('item_name', pa.string()),
+            ('value', pa.int64()),
+            ('dev', pa.string()),
+            ('company', pa.string()),
+            ('founding_year', pa.int32()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+    'csv': CsvLedgerWriter,
+    'jsonl': JsonlLedgerWriter,
+    'parquet': ParquetLedgerWriter,
+}
+
+
+def export_ledger(path, file_format=None, engine=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None,
+                  **filters):
+    """Writes the ledger rows matching filters to path, chunk_size rows at a time
+
+    file_format defaults to the file extension. filters are passed to
+    ledger_select(). progress, if given, is called as
+    progress(rows_written, elapsed_seconds) after each chunk. Returns a dict
+    with the row count, elapsed time and rows/sec.
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format not in WRITERS:
+        raise ValueError(f"Unsupported output format: {file_format!r}")
+    engine = engine or get_engine()
+    written = 0
+    start = time.perf_counter()
+
+    writer = WRITERS[file_format](path)
+    try:
+        with engine.connect() as connection:
+            for name, value in EXPORT_PRAGMAS.items():
+                connection.exec_driver_sql(f"PRAGMA {name}={value}")
+            try:
+                result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                    ledger_select(**filters)
+                )
+                for chunk in result.partitions():
+                    writer.write(chunk)
+                    written += len(chunk)
+                    if progress:
+                        progress(written, time.perf_counter() - start)
+            finally:
+                for name in EXPORT_PRAGMAS:
+                    connection.exec_driver_sql(f"PRAGMA {name}={SQLITE_PRAGMAS[name]}")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': written,
+        'seconds': elapsed,
+        'rows_per_sec': written / elapsed if elapsed else 0.0,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB
+
+    VmHWM is read where /proc has it: ru_maxrss survives exec, so a child
+    of a large process would otherwise report its parent's peak.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Linux and BSD report KB here, macOS reports bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="Output .csv, .jsonl or .parquet file")
+    parser.add_argument('--format', choices=sorted(WRITERS), help="Defaults to the file extension")
+    parser.add_argument('--company', action='append', help="Only this company (repeatable)")
+    parser.add_argument('--dev', action='append', help="Only this dev (repeatable)")
+    parser.add_argument('--min-value', type=int)
+    parser.add_argument('--max-value', type=int)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--quiet', action='store_true', help="No per-chunk progress")
+    args = parser.parse_args()
+
+    print(f"Exporting ledger to {args.path}...")
+    stats = export_ledger(
+        args.path,
+        file_format=args.format,
+        chunk_size=args.chunk_size,
+        progress=None if args.quiet else print_progress,
+        companies=args.company,
+        devs=args.dev,
+        min_value=args.min_value,
+        max_value=args.max_value,
+    )
+    print(f" Exported {stats['rows']:,} rows in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec, peak RSS {peak_rss_mb():.0f} MB)")
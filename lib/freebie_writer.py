@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Write-behind buffer for high-rate Company.give_freebie calls
+
+FreebieWriter collects giveaways from any number of threads and a single
+writer thread inserts them in grouped transactions. A batch is flushed once
+it has batch_size rows or its oldest row has waited flush_interval seconds,
+so thousands of giveaways share one commit instead of paying one fsync
+each.
+
+    with FreebieWriter() as writer:
+        future = writer.give_freebie(company, dev, "T-shirt", 500)
+        future.result()     # blocks until committed; returns the freebie id
+
+Guarantees:
+  - give_freebie() blocks once max_queue rows are waiting (backpressure),
+    or raises queue.Full if a timeout is given
+  - a future resolves only after its batch has committed, with the new
+    freebie's id; if a batch fails, its rows are retried one by one so a
+    bad row fails only its own future
+  - flush() waits for everything queued before it; close() and interpreter
+    exit flush whatever is still queued
+  - after close(), give_freebie() and flush() raise RuntimeError
+
+Commits follow the engine's pragmas: with WAL and synchronous=NORMAL a
+committed batch survives a process crash but not a power cut.
+"""
+
+import atexit
+from collections import ChainMap, deque
+from concurrent.futures import Future
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from models import Freebie, intern_items
+from database import get_engine
+
+_STOP = object()
+
+
+class WriterStats:
+    """Batch sizes, latencies and queue depth seen by the writer thread"""
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        # Recent batches only, so a long-running writer stays bounded
+        self.batch_seconds = deque(maxlen=10000)
+
+    def percentile(self, fraction):
+        if not self.batch_seconds:
+            return 0.0
+        ordered = sorted(self.batch_seconds)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'batches': self.batches,
+            'errors': self.errors,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'batch_p50_seconds': self.percentile(0.50),
+            'batch_p99_seconds': self.percentile(0.99),
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+
+class FreebieWriter:
+    """Thread-safe write-behind queue that inserts freebies in grouped transactions"""
+
+    def __init__(self, engine=None, batch_size=1000, flush_interval=0.05, max_queue=10000):
+        self.engine = engine or get_engine()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = WriterStats()
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Item name -> items.id, only touched by the writer thread
+        self._item_ids = {}
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        with self._lock:
+            self._start()
+        return self
+
+    def _start(self):
+        """Starts the writer thread if needed; the caller holds _lock"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='FreebieWriter', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def give_freebie(self, company, dev, item_name, value, timeout=None):
+        """Queues a freebie from company to dev and returns a Future of its id
+
+        company and dev may be instances or ids. Blocks while the queue is
+        full; with a timeout, raises queue.Full if no room frees up in time.
+        """
+        future = Future()
+        row = {
+            'item_name': item_name,
+            'value': value,
+            'dev_id': getattr(dev, 'id', dev),
+            'company_id': getattr(company, 'id', company),
+        }
+        # Held across the put so no row can land behind close()'s _STOP
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FreebieWriter is closed")
+            self._start()
+            self._queue.put((row, future), timeout=timeout)
+        return future
+
+    def flush(self, timeout=None):
+        """Blocks until every freebie queued before this call is committed"""
+        marker = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FreebieWriter is closed")
+            if self._thread is None:
+                return
+            self._queue.put((None, marker))
+        marker.result(timeout)
+
+    def close(self):
+        """Flushes the queue and stops the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put((_STOP, None))
+            thread.join()
+            atexit.unregister(self.close)
+
+    # Writer thread
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, markers, stopping = self._collect()
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set_result(None)
+        # Nothing should follow _STOP, but never leave a future unresolved
+        while True:
+            try:
+                row, future = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None:
+                future.set_exception(RuntimeError("FreebieWriter is closed"))
+
+    def _collect(self):
+        """Waits for a first row, then gathers more until the batch is full or due"""
+        batch, markers = [], []
+        row, future = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if row is _STOP:
+                return batch, markers, True
+            if row is None:
+                # flush() marker: write what we have now
+                markers.append(future)
+                return batch, markers, False
+            batch.append((row, future))
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self._queue.qsize() + len(batch))
+            if len(batch) >= self.batch_size:
+                return batch, markers, False
+            remaining = deadline - time.monotonic()
+            try:
+                row, future = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return batch, markers, False
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        statement = insert(Freebie).returning(Freebie.id, sort_by_parameter_order=True)
+        try:
+            with self.engine.begin() as connection:
+                new_names = {row['item_name'] for row, _ in batch} - self._item_ids.keys()
+                new_item_ids = intern_items(connection, new_names) if new_names else {}
+                item_ids = ChainMap(self._item_ids, new_item_ids)
+                ids = connection.execute(statement, [
+                    {
+                        'item_id': item_ids[row['item_name']],
+                        'value': row['value'],
+                        'dev_id': row['dev_id'],
+                        'company_id': row['company_id'],
+                    }
+                    for row, _ in batch
+                ]).scalars().all()
+            # Cached only once committed, since a rollback undoes new items too
+            self._item_ids.update(new_item_ids)
+        except Exception as error:
+            if len(batch) == 1:
+                self.stats.errors += 1
+                batch[0][1].set_exception(error)
+                return
+            for item in batch:
+                self._write([item])
+            return
+        self.stats.batch_seconds.append(time.perf_counter() - start)
+        self.stats.batches += 1
+        self.stats.rows += len(batch)
+        for (_, future), freebie_id in zip(batch, ids):
+            future.set_result(freebie_id)
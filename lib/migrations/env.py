@@ -19,8 +19,38 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from models import Base
+from online_migration import SHADOW_PREFIX
+from search import FTS_TABLE
 target_metadata = Base.metadata
 
+# Target database: "-x db_url=..." (used by shards.py to migrate each shard),
+# else FREEBIES_DATABASE_URL so migrations hit the same file as the app
+import os
+x_args = context.get_x_argument(as_dictionary=True)
+db_url = x_args.get('db_url') or os.environ.get('FREEBIES_DATABASE_URL')
+if db_url:
+    config.set_main_option('sqlalchemy.url', db_url)
+
+# Options for online_migration.rebuild_table(): "-x online_chunk_size=N"
+# sets rows per copy transaction, "-x online_pause=SECONDS" the gap left for
+# other writers between them, and "-x online_migrations=false" makes it a
+# single-transaction copy like batch mode
+online_migration = {
+    'enabled': x_args.get('online_migrations', 'true').lower() not in ('0', 'false', 'off', 'no'),
+}
+if x_args.get('online_chunk_size'):
+    online_migration['chunk_size'] = int(x_args['online_chunk_size'])
+if x_args.get('online_pause'):
+    online_migration['pause'] = float(x_args['online_pause'])
+
+
+def include_name(name, type_, parent_names):
+    """Hides the FTS5 search index, its shadow tables and unfinished online rebuilds from autogenerate"""
+    if type_ == 'table' and name and name.startswith((FTS_TABLE, SHADOW_PREFIX)):
+        return False
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -43,6 +73,8 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
+        online_migration=online_migration,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -67,6 +99,7 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection, target_metadata=target_metadata, render_as_batch=True,
+            include_name=include_name, online_migration=online_migration,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,33 @@
+"""add freebie lookup indexes
+
+Revision ID: 3c9e1f2a7b64
+Revises: 190040d5c3eb
+Create Date: 2026-10-18 15:02:11.408213
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f2a7b64'
+down_revision = '190040d5c3eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_companies_name'), 'companies', ['name'], unique=False)
+    op.create_index(op.f('ix_companies_founding_year'), 'companies', ['founding_year'], unique=False)
+    op.create_index(op.f('ix_devs_name'), 'devs', ['name'], unique=False)
+    op.create_index(op.f('ix_freebies_company_id'), 'freebies', ['company_id'], unique=False)
+    op.create_index(op.f('ix_freebies_dev_id_item_name'), 'freebies', ['dev_id', 'item_name'], unique=False)
+    op.create_index(op.f('ix_freebies_item_name'), 'freebies', ['item_name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_freebies_item_name'), table_name='freebies')
+    op.drop_index(op.f('ix_freebies_dev_id_item_name'), table_name='freebies')
+    op.drop_index(op.f('ix_freebies_company_id'), table_name='freebies')
+    op.drop_index(op.f('ix_devs_name'), table_name='devs')
+    op.drop_index(op.f('ix_companies_founding_year'), table_name='companies')
+    op.drop_index(op.f('ix_companies_name'), table_name='companies')
@@ -0,0 +1,48 @@
+"""add freebie events change feed
+
+Revision ID: 4e8b1d6f2a93
+Revises: 9c3d7a5e1f08
+Create Date: 2026-10-18 21:14:52.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from events import create_triggers, drop_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b1d6f2a93'
+down_revision = '9c3d7a5e1f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('freebie_events',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('freebie_id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.Column('from_dev_id', sa.Integer(), nullable=True),
+        sa.Column('to_dev_id', sa.Integer(), nullable=True),
+        sa.Column('recorded_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True
+    )
+    op.create_table('event_checkpoints',
+        sa.Column('consumer', sa.String(), nullable=False),
+        sa.Column('last_seq', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.PrimaryKeyConstraint('consumer')
+    )
+    # No backfill: consumers start from a copy of freebies, then tail the feed
+    create_triggers(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_triggers(op.get_bind())
+    op.drop_table('event_checkpoints')
+    op.drop_table('freebie_events')
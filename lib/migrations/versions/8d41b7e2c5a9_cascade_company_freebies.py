@@ -0,0 +1,32 @@
+"""cascade company deletes to freebies
+
+Revision ID: 8d41b7e2c5a9
+Revises: 3c9e1f2a7b64
+Create Date: 2026-10-18 16:20:43.117090
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7e2c5a9'
+down_revision = '3c9e1f2a7b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('freebies', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_freebies_company_id_companies', type_='foreignkey')
+        batch_op.create_foreign_key(
+            batch_op.f('fk_freebies_company_id_companies'), 'companies', ['company_id'], ['id'],
+            ondelete='CASCADE',
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('freebies', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_freebies_company_id_companies', type_='foreignkey')
+        batch_op.create_foreign_key(
+            batch_op.f('fk_freebies_company_id_companies'), 'companies', ['company_id'], ['id'],
+        )
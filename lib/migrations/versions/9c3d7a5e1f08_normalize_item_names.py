@@ -0,0 +1,96 @@
+"""normalize item names into an items catalog
+
+Revision ID: 9c3d7a5e1f08
+Revises: f2b8d61a4c3e
+Create Date: 2026-10-18 18:32:07.419583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from counters import create_triggers, drop_triggers
+from search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3d7a5e1f08'
+down_revision = 'f2b8d61a4c3e'
+branch_labels = None
+depends_on = None
+
+# The freebies-based search index from f2b8d61a4c3e, restored on downgrade
+LEGACY_SEARCH_INDEX = [
+    """CREATE VIRTUAL TABLE freebies_fts USING fts5(
+        item_name, content='freebies', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER trg_freebies_fts_insert AFTER INSERT ON freebies BEGIN
+        INSERT INTO freebies_fts (rowid, item_name) VALUES (NEW.id, NEW.item_name);
+    END""",
+    """CREATE TRIGGER trg_freebies_fts_delete AFTER DELETE ON freebies BEGIN
+        INSERT INTO freebies_fts (freebies_fts, rowid, item_name) VALUES ('delete', OLD.id, OLD.item_name);
+    END""",
+    """CREATE TRIGGER trg_freebies_fts_update AFTER UPDATE OF item_name ON freebies BEGIN
+        INSERT INTO freebies_fts (freebies_fts, rowid, item_name) VALUES ('delete', OLD.id, OLD.item_name);
+        INSERT INTO freebies_fts (rowid, item_name) VALUES (NEW.id, NEW.item_name);
+    END""",
+    "INSERT INTO freebies_fts (freebies_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    # Rebuilding freebies below drops its triggers, so the counters come off
+    # first and go back on at the end
+    drop_triggers(connection)
+    for name in ('insert', 'delete', 'update'):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_freebies_fts_{name}")
+    op.execute("DROP TABLE IF EXISTS freebies_fts")
+
+    op.create_table('items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_items_name'), 'items', ['name'], unique=True)
+    # One catalog row per distinct name, then point every freebie at its row
+    op.execute("INSERT INTO items (name) SELECT DISTINCT item_name FROM freebies ORDER BY item_name")
+    op.add_column('freebies', sa.Column('item_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE freebies SET item_id = (SELECT id FROM items WHERE items.name = freebies.item_name)")
+
+    with op.batch_alter_table('freebies', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_freebies_dev_id_item_name'))
+        batch_op.drop_index(batch_op.f('ix_freebies_item_name'))
+        batch_op.drop_column('item_name')
+        batch_op.alter_column('item_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key(batch_op.f('fk_freebies_item_id_items'), 'items', ['item_id'], ['id'])
+        batch_op.create_index(batch_op.f('ix_freebies_dev_id_item_id'), ['dev_id', 'item_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_freebies_item_id'), ['item_id'], unique=False)
+
+    create_triggers(connection)
+    create_search_index(connection)
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    drop_search_index(connection)
+    drop_triggers(connection)
+
+    op.add_column('freebies', sa.Column('item_name', sa.String(), nullable=True))
+    op.execute("UPDATE freebies SET item_name = (SELECT name FROM items WHERE items.id = freebies.item_id)")
+
+    with op.batch_alter_table('freebies', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_freebies_item_id'))
+        batch_op.drop_index(batch_op.f('ix_freebies_dev_id_item_id'))
+        batch_op.drop_constraint(batch_op.f('fk_freebies_item_id_items'), type_='foreignkey')
+        batch_op.drop_column('item_id')
+        batch_op.alter_column('item_name', existing_type=sa.String(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_freebies_item_name'), ['item_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_freebies_dev_id_item_name'), ['dev_id', 'item_name'], unique=False)
+
+    op.drop_index(op.f('ix_items_name'), table_name='items')
+    op.drop_table('items')
+
+    create_triggers(connection)
+    for statement in LEGACY_SEARCH_INDEX:
+        op.execute(statement)
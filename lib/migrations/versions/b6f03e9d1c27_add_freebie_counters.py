@@ -0,0 +1,56 @@
+"""add denormalized freebie counters
+
+Revision ID: b6f03e9d1c27
+Revises: 8d41b7e2c5a9
+Create Date: 2026-10-18 17:05:37.562901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from counters import create_triggers, drop_triggers, rebuild_counters
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f03e9d1c27'
+down_revision = '8d41b7e2c5a9'
+branch_labels = None
+depends_on = None
+
+COMPANY_COUNTERS = ('freebie_count', 'total_value', 'distinct_dev_count')
+DEV_COUNTERS = ('freebie_count', 'total_value', 'distinct_company_count')
+
+
+def upgrade() -> None:
+    # Plain ADD COLUMN with a default avoids rebuilding either table
+    for column in COMPANY_COUNTERS:
+        op.add_column('companies', sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+    for column in DEV_COUNTERS:
+        op.add_column('devs', sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_table('company_devs',
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('dev_id', sa.Integer(), nullable=False),
+        sa.Column('freebie_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], name=op.f('fk_company_devs_company_id_companies'), ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['dev_id'], ['devs.id'], name=op.f('fk_company_devs_dev_id_devs'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('company_id', 'dev_id')
+    )
+    op.create_index(op.f('ix_company_devs_dev_id'), 'company_devs', ['dev_id'], unique=False)
+
+    connection = op.get_bind()
+    create_triggers(connection)
+    # Backfill everything already in freebies
+    rebuild_counters(connection)
+
+
+def downgrade() -> None:
+    drop_triggers(op.get_bind())
+    op.drop_index(op.f('ix_company_devs_dev_id'), table_name='company_devs')
+    op.drop_table('company_devs')
+    with op.batch_alter_table('devs', schema=None) as batch_op:
+        for column in reversed(DEV_COUNTERS):
+            batch_op.drop_column(column)
+    with op.batch_alter_table('companies', schema=None) as batch_op:
+        for column in reversed(COMPANY_COUNTERS):
+            batch_op.drop_column(column)
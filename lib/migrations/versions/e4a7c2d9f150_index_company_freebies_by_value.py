@@ -0,0 +1,26 @@
+"""index company freebies by value
+
+Revision ID: e4a7c2d9f150
+Revises: b6f03e9d1c27
+Create Date: 2026-10-18 16:05:42.117385
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d9f150'
+down_revision = 'b6f03e9d1c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # (company_id, value) still serves plain company_id lookups
+    op.create_index(op.f('ix_freebies_company_id_value'), 'freebies', ['company_id', 'value'], unique=False)
+    op.drop_index(op.f('ix_freebies_company_id'), table_name='freebies')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_freebies_company_id'), 'freebies', ['company_id'], unique=False)
+    op.drop_index(op.f('ix_freebies_company_id_value'), table_name='freebies')
@@ -0,0 +1,53 @@
+"""add freebie search index
+
+Revision ID: f2b8d61a4c3e
+Revises: e4a7c2d9f150
+Create Date: 2026-10-18 17:48:20.536114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d61a4c3e'
+down_revision = 'e4a7c2d9f150'
+branch_labels = None
+depends_on = None
+
+# Spelled out rather than imported from search.py, which now indexes the
+# items table instead (see 9c3d7a5e1f08)
+CREATE_STATEMENTS = [
+    """CREATE VIRTUAL TABLE freebies_fts USING fts5(
+        item_name, content='freebies', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER trg_freebies_fts_insert AFTER INSERT ON freebies BEGIN
+        INSERT INTO freebies_fts (rowid, item_name) VALUES (NEW.id, NEW.item_name);
+    END""",
+    """CREATE TRIGGER trg_freebies_fts_delete AFTER DELETE ON freebies BEGIN
+        INSERT INTO freebies_fts (freebies_fts, rowid, item_name) VALUES ('delete', OLD.id, OLD.item_name);
+    END""",
+    """CREATE TRIGGER trg_freebies_fts_update AFTER UPDATE OF item_name ON freebies BEGIN
+        INSERT INTO freebies_fts (freebies_fts, rowid, item_name) VALUES ('delete', OLD.id, OLD.item_name);
+        INSERT INTO freebies_fts (rowid, item_name) VALUES (NEW.id, NEW.item_name);
+    END""",
+    "INSERT INTO freebies_fts (freebies_fts) VALUES ('rebuild')",
+]
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS trg_freebies_fts_insert",
+    "DROP TRIGGER IF EXISTS trg_freebies_fts_delete",
+    "DROP TRIGGER IF EXISTS trg_freebies_fts_update",
+    "DROP TABLE IF EXISTS freebies_fts",
+]
+
+
+def upgrade() -> None:
+    # Creates freebies_fts and its sync triggers, then indexes existing rows
+    for statement in CREATE_STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for statement in DROP_STATEMENTS:
+        op.execute(statement)
@@ -1,23 +1,130 @@
-from sqlalchemy import ForeignKey, Column, Integer, String, MetaData, create_engine
-from sqlalchemy.orm import relationship, declarative_base, sessionmaker
+from sqlalchemy import (
+    DDL, DateTime, ForeignKey, Column, Index, Integer, String, MetaData, case, event, exists, func, select,
+    tuple_, update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
+from sqlalchemy.orm import (
+    Query, Session, relationship, declarative_base, joinedload, object_session, selectinload,
+)
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import operators
+from typing import Any, List, NamedTuple, Optional
 import os
 
+from database import get_engine, new_session, schema_is_current, session_scope
+from counters import TRIGGERS
+import events
+import search
+from search import items_fts, fts_match, match_expression
+
 convention = {
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "ix": "ix_%(table_name)s_%(column_0_N_name)s",
 }
 metadata = MetaData(naming_convention=convention)
 
 Base = declarative_base(metadata=metadata)
 
+# Keeps IN (...) lists well under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+
+
+def in_chunks(values, size=IN_CHUNK_SIZE):
+    """Splits values into lists of at most size items"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _keyset_batches(session, statement, id_column, batch_size):
+    """Yields the entities selected by statement in id order, batch_size per SELECT"""
+    last_id = None
+    while True:
+        batch_statement = statement
+        if last_id is not None:
+            batch_statement = batch_statement.where(id_column > last_id)
+        batch = session.scalars(batch_statement.order_by(id_column).limit(batch_size)).all()
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1].id
+
+
+class FreebiePage(NamedTuple):
+    """One page of a freebies listing; pass next_cursor as after= for the next"""
+    items: List[Any]
+    next_cursor: Optional[Any]
+
+
+# Sort keys for freebie pages; id breaks ties so every key is unique
+FREEBIE_PAGE_ORDERS = {
+    'id': ('id',),
+    'value': ('value', 'id'),
+}
+
+
+def _freebies_page(owner, owner_column, after, limit, order_by, descending):
+    """Returns the FreebiePage of owner's freebies that follows the cursor after
+
+    The cursor is the sort key of the last row seen: its id, or (value, id)
+    when ordering by value. A list, as a cursor decoded from JSON comes
+    back, is accepted in place of a tuple.
+    """
+    if order_by not in FREEBIE_PAGE_ORDERS:
+        raise ValueError(f"Cannot page freebies by {order_by!r}")
+    key_names = FREEBIE_PAGE_ORDERS[order_by]
+    if after is not None:
+        after = tuple(after) if isinstance(after, (list, tuple)) else (after,)
+        if len(after) != len(key_names):
+            raise ValueError(f"Cursor {after!r} does not match the {order_by!r} sort key {key_names}")
+
+    def sort_key(freebie):
+        return tuple(getattr(freebie, name) for name in key_names)
+
+    session = object_session(owner)
+    if session is None:
+        # Not attached to a session yet, so page the in-memory collection
+        items = sorted(owner.freebies, key=sort_key, reverse=descending)
+        if after is not None:
+            items = [freebie for freebie in items
+                     if (sort_key(freebie) < after if descending else sort_key(freebie) > after)]
+    else:
+        key_columns = [getattr(Freebie, name) for name in key_names]
+        statement = select(Freebie).where(owner_column == owner.id)
+        if after is not None:
+            key = tuple_(*key_columns) if len(key_columns) > 1 else key_columns[0]
+            bound = tuple_(*after) if len(after) > 1 else after[0]
+            statement = statement.where(key < bound if descending else key > bound)
+        statement = statement.order_by(*[
+            column.desc() if descending else column.asc() for column in key_columns
+        ])
+        # One extra row tells whether another page follows
+        items = session.scalars(statement.limit(limit + 1)).all()
+
+    if len(items) > limit:
+        last = sort_key(items[limit - 1])
+        return FreebiePage(items[:limit], last if len(last) > 1 else last[0])
+    return FreebiePage(list(items), None)
+
+
 class Company(Base):
     __tablename__ = 'companies'
 
     id = Column(Integer(), primary_key=True)
-    name = Column(String())
-    founding_year = Column(Integer())
+    name = Column(String(), index=True)
+    founding_year = Column(Integer(), index=True)
 
-    # Relationship to freebies
-    freebies = relationship('Freebie', back_populates='company')
+    # Maintained by the triggers in counters.py; refreshed on commit/expire
+    freebie_count = Column(Integer(), nullable=False, default=0, server_default='0')
+    total_value = Column(Integer(), nullable=False, default=0, server_default='0')
+    distinct_dev_count = Column(Integer(), nullable=False, default=0, server_default='0')
+
+    # Relationship to freebies; deleting a company leaves removing its
+    # freebies to ON DELETE CASCADE instead of loading them one by one
+    freebies = relationship(
+        'Freebie', back_populates='company', cascade='all, delete-orphan', passive_deletes=True,
+    )
 
     def __repr__(self):
         return f'<Company {self.name}>'
@@ -35,29 +142,84 @@ class Company(Base):
         return new_freebie
 
     @classmethod
-    def oldest_company(cls):
-        """Returns the Company instance with the earliest founding year"""
-        # Fix database path - use current directory
-        db_path = os.path.join(os.path.dirname(__file__), 'freebies.db')
-        engine = create_engine(f'sqlite:///{db_path}')
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
-        oldest = session.query(cls).order_by(cls.founding_year.asc()).first()
-        session.close()
-        return oldest
+    def oldest_company(cls, session=None):
+        """Returns the Company instance with the earliest founding year
+
+        Pass a session to reuse its connection; otherwise a short-lived one is
+        taken from the shared pool in database.py.
+        """
+        with session_scope(session) as session:
+            return session.scalars(cls.oldest_company_select()).first()
+
+    @classmethod
+    def oldest_company_select(cls):
+        """SELECT for oldest_company(), shared with the async data-access layer
+
+        Matching MIN(founding_year) is two index lookups, where ORDER BY ...
+        LIMIT 1 plans as a scan of the founding_year index.
+        """
+        earliest = select(func.min(cls.founding_year)).scalar_subquery()
+        return select(cls).where(cls.founding_year == earliest).order_by(cls.id).limit(1)
+
+    def devs_select(self):
+        """SELECT for the distinct devs holding a freebie from this company"""
+        dev_ids = select(Freebie.dev_id).where(Freebie.company_id == self.id)
+        return select(Dev).where(Dev.id.in_(dev_ids))
 
     @property
     def devs(self):
         """Returns a collection of all devs who collected freebies from the company"""
-        return list(set([freebie.dev for freebie in self.freebies]))
+        session = object_session(self)
+        if session is None:
+            # Not attached to a session yet, so only the in-memory freebies exist
+            return list(set([freebie.dev for freebie in self.freebies]))
+        return session.scalars(self.devs_select().order_by(Dev.id)).all()
+
+    @property
+    def devs_count(self):
+        """Returns the number of distinct devs without loading them"""
+        session = object_session(self)
+        if session is None:
+            return len(self.devs)
+        return session.query(func.count(func.distinct(Freebie.dev_id))).filter(
+            Freebie.company_id == self.id
+        ).scalar()
+
+    def freebies_page(self, after=None, limit=50, order_by='id', descending=False):
+        """Returns a FreebiePage of this company's freebies by keyset pagination
+
+        Each page is one indexed query however large the company is, and
+        self.freebies is never loaded.
+        """
+        return _freebies_page(self, Freebie.company_id, after, limit, order_by, descending)
+
+    @property
+    def freebies_count(self):
+        """Returns the number of freebies without loading them"""
+        session = object_session(self)
+        if session is None or 'freebies' in self.__dict__:
+            return len(self.freebies)
+        return session.scalar(select(func.count()).where(Freebie.company_id == self.id))
+
+    def iter_devs(self, batch_size=1000):
+        """Yields the company's devs in id order, batch_size per query"""
+        session = object_session(self)
+        if session is None:
+            yield from self.devs
+            return
+        yield from _keyset_batches(session, self.devs_select(), Dev.id, batch_size)
 
 
 class Dev(Base):
     __tablename__ = 'devs'
 
     id = Column(Integer(), primary_key=True)
-    name = Column(String())
+    name = Column(String(), index=True)
+
+    # Maintained by the triggers in counters.py; refreshed on commit/expire
+    freebie_count = Column(Integer(), nullable=False, default=0, server_default='0')
+    total_value = Column(Integer(), nullable=False, default=0, server_default='0')
+    distinct_company_count = Column(Integer(), nullable=False, default=0, server_default='0')
 
     # Relationship to freebies
     freebies = relationship('Freebie', back_populates='dev')
@@ -65,65 +227,555 @@ class Dev(Base):
     def __repr__(self):
         return f'<Dev {self.name}>'
 
+    def companies_select(self):
+        """SELECT for the distinct companies this dev has a freebie from"""
+        company_ids = select(Freebie.company_id).where(Freebie.dev_id == self.id)
+        return select(Company).where(Company.id.in_(company_ids))
+
     @property
     def companies(self):
         """Returns a collection of all companies that the Dev has collected freebies from"""
-        return list(set([freebie.company for freebie in self.freebies]))
+        session = object_session(self)
+        if session is None:
+            # Not attached to a session yet, so only the in-memory freebies exist
+            return list(set([freebie.company for freebie in self.freebies]))
+        return session.scalars(self.companies_select().order_by(Company.id)).all()
+
+    @property
+    def companies_count(self):
+        """Returns the number of distinct companies without loading them"""
+        session = object_session(self)
+        if session is None:
+            return len(self.companies)
+        return session.query(func.count(func.distinct(Freebie.company_id))).filter(
+            Freebie.dev_id == self.id
+        ).scalar()
+
+    def freebies_page(self, after=None, limit=50, order_by='id', descending=False):
+        """Returns a FreebiePage of this dev's freebies by keyset pagination"""
+        return _freebies_page(self, Freebie.dev_id, after, limit, order_by, descending)
+
+    @property
+    def freebies_count(self):
+        """Returns the number of freebies without loading them"""
+        session = object_session(self)
+        if session is None or 'freebies' in self.__dict__:
+            return len(self.freebies)
+        return session.scalar(select(func.count()).where(Freebie.dev_id == self.id))
+
+    def iter_companies(self, batch_size=1000):
+        """Yields the dev's companies in id order, batch_size per query"""
+        session = object_session(self)
+        if session is None:
+            yield from self.companies
+            return
+        yield from _keyset_batches(session, self.companies_select(), Company.id, batch_size)
 
     # Aggregate Methods
-    def received_one(self, item_name):
-        """Returns True if any of the freebies associated with the dev has that item_name"""
-        return any(freebie.item_name == item_name for freebie in self.freebies)
+    def received_one(self, item_name, cache=False):
+        """Returns True if any of the freebies associated with the dev has that item_name
+
+        Uses an indexed EXISTS query unless the freebies are already loaded.
+        With cache=True the dev's item names are fetched once and kept on the
+        instance until one of its freebies changes hands or is deleted, or
+        the dev is expired.
+        """
+        session = object_session(self)
+        if session is None or 'freebies' in self.__dict__:
+            return any(freebie.item_name == item_name for freebie in self.freebies)
+
+        if cache:
+            return item_name in self._received_item_names(session)
+
+        return session.scalar(self.received_one_select(item_name))
+
+    def received_one_select(self, item_name):
+        """SELECT EXISTS(...) for whether this dev holds a freebie called item_name"""
+        return select(exists().where(Freebie.dev_id == self.id, Freebie.item_name == item_name))
+
+    def _received_item_names(self, session):
+        """Returns the cached set of item names this dev holds, loading it if needed"""
+        item_names = self.__dict__.get('_item_name_cache')
+        if item_names is None:
+            rows = session.query(Item.name).filter(
+                Item.id.in_(select(Freebie.item_id).where(Freebie.dev_id == self.id))
+            )
+            item_names = {item_name for (item_name,) in rows}
+            self.__dict__['_item_name_cache'] = item_names
+        return item_names
+
+    def received_many(self, item_names):
+        """Returns {item_name: bool} for every name given, in one query per 500 names"""
+        item_names = list(item_names)
+        session = object_session(self)
+        if session is None or 'freebies' in self.__dict__:
+            held = {freebie.item_name for freebie in self.freebies}
+        else:
+            held = set()
+            for chunk in in_chunks(set(item_names)):
+                held.update(item_name for (item_name,) in session.query(Item.name).filter(
+                    Item.name.in_(chunk),
+                    Item.id.in_(select(Freebie.item_id).where(Freebie.dev_id == self.id)),
+                ))
+        return {item_name: item_name in held for item_name in item_names}
 
     def give_away(self, dev, freebie):
         """Changes the freebie's dev to be the given dev if the freebie belongs to this dev"""
-        if freebie in self.freebies:
+        # Checking the freebie's own many-to-one avoids loading self.freebies
+        if freebie.dev is self:
             freebie.dev = dev
             return True
         return False
 
+    def give_away_all(self, to_dev, filter=None):
+        """Moves every freebie of this dev (optionally matching filter) to to_dev
+
+        filter is a SQL expression on Freebie, e.g. Freebie.value < 1000. Runs
+        one UPDATE and returns the number of freebies moved. A dev outside a
+        session moves its in-memory freebies instead, and cannot take a filter.
+        """
+        criteria = [Freebie.dev_id == self.id]
+        if filter is not None:
+            criteria.append(filter)
+        return _move_freebies(self, to_dev, [criteria], None if filter is not None else lambda freebie: True)
+
+
+class Item(Base):
+    """Catalog of item names; each distinct name is stored once"""
+    __tablename__ = 'items'
+
+    id = Column(Integer(), primary_key=True)
+    name = Column(String(), nullable=False, unique=True, index=True)
+
+    def __repr__(self):
+        return f'<Item {self.name}>'
+
+
+def intern_items(connection, names):
+    """Returns {name: item id} for names, adding any that are not in items yet
+
+    For Core write paths (bulk loads, the write-behind writer); ORM code
+    just sets Freebie.item_name.
+    """
+    names = set(names)
+    ids = {}
+    for chunk in in_chunks(names):
+        connection.execute(
+            sqlite_insert(Item).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name} for name in chunk],
+        )
+        ids.update(connection.execute(select(Item.name, Item.id).where(Item.name.in_(chunk))).all())
+    return ids
+
+
+class ItemNameComparator(Comparator):
+    """Runs Freebie.item_name comparisons on the integer item_id
+
+    item_name == 'x' becomes item_id = (SELECT id FROM items WHERE name = 'x'),
+    which the freebies indexes on item_id can serve; != uses IS NOT, so a
+    name missing from items matches every freebie. Other operators fall
+    back to the item's name, one correlated lookup per row. To group by
+    name, group by item_id and join items, as reports.py does.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        name = select(Item.name).where(Item.id == cls.item_id).correlate_except(Item).scalar_subquery()
+        # item_id is never NULL; naming it outside the subquery puts freebies
+        # in the enclosing FROM, so select(Freebie.item_name) on its own
+        # still yields one correlated name per freebie
+        super().__init__(case((cls.item_id.is_not(None), name)).label('item_name'))
+
+    def operate(self, op, *other, **kwargs):
+        if op is operators.eq:
+            return self.cls.item_id == select(Item.id).where(Item.name == other[0]).scalar_subquery()
+        if op is operators.ne:
+            # A name missing from items makes the subquery NULL, which != never matches
+            return self.cls.item_id.is_not(select(Item.id).where(Item.name == other[0]).scalar_subquery())
+        if op in (operators.in_op, operators.not_in_op):
+            return op(self.cls.item_id, select(Item.id).where(Item.name.in_(other[0])))
+        return op(self.expression, *other, **kwargs)
+
 
 class Freebie(Base):
     __tablename__ = 'freebies'
+    __table_args__ = (
+        # Also serves plain dev_id lookups, so dev_id has no index of its own
+        Index(None, 'dev_id', 'item_id'),
+        # Serves company_id lookups and freebies_page(order_by='value')
+        Index(None, 'company_id', 'value'),
+    )
 
     id = Column(Integer(), primary_key=True)
-    item_name = Column(String(), nullable=False)
     value = Column(Integer(), nullable=False)
     
     # Foreign Keys
+    item_id = Column(Integer(), ForeignKey('items.id'), nullable=False, index=True)
     dev_id = Column(Integer(), ForeignKey('devs.id'), nullable=False)
-    company_id = Column(Integer(), ForeignKey('companies.id'), nullable=False)
+    company_id = Column(Integer(), ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
 
-    # Relationships
+    # Relationships; the item is small and always wanted, so it is joined in
+    item = relationship('Item', lazy='joined', innerjoin=True)
     dev = relationship('Dev', back_populates='freebies')
     company = relationship('Company', back_populates='freebies')
 
+    @hybrid_property
+    def item_name(self):
+        """The item's name; assigning a name reuses its items row on flush"""
+        return self.item.name if self.item is not None else None
+
+    @item_name.inplace.setter
+    def _item_name_setter(self, name):
+        # A placeholder until flush, when _intern_new_items swaps in the
+        # catalog row for that name
+        self.item = Item(name=name)
+
+    @item_name.inplace.comparator
+    @classmethod
+    def _item_name_comparator(cls):
+        return ItemNameComparator(cls)
+
     def __repr__(self):
         return f'<Freebie {self.item_name}>'
 
+    @classmethod
+    def who_received(cls, item_name, dev_ids, session=None):
+        """Returns the subset of dev_ids holding a freebie called item_name"""
+        received = set()
+        with session_scope(session) as session:
+            for chunk in in_chunks(set(dev_ids)):
+                received.update(dev_id for (dev_id,) in session.query(cls.dev_id).filter(
+                    cls.item_name == item_name, cls.dev_id.in_(chunk)
+                ).distinct())
+        return received
+
+    @classmethod
+    def details_select(cls, company_id=None, dev_id=None):
+        """SELECT of freebies in id order with their dev and company joined in"""
+        statement = select(cls).options(*FREEBIE_DETAILS).order_by(cls.id)
+        if company_id is not None:
+            statement = statement.where(cls.company_id == company_id)
+        if dev_id is not None:
+            statement = statement.where(cls.dev_id == dev_id)
+        return statement
+
+    @classmethod
+    def list_details(cls, session=None, company_id=None, dev_id=None, limit=None):
+        """Returns freebies ready for print_details() in a single query"""
+        statement = cls.details_select(company_id, dev_id)
+        if limit is not None:
+            statement = statement.limit(limit)
+        with session_scope(session) as session:
+            return session.scalars(statement).all()
+
+    @classmethod
+    def search(cls, query, company=None, dev=None, limit=20, session=None):
+        """Returns freebies whose item name matches query, best match first
+
+        Every word of query must match the start of a word in the item
+        name, so "t-shirt" and "ODM ban" both work. company and dev narrow
+        the results and may be instances or ids. Uses the items_fts index,
+        so names are ranked once per item rather than once per freebie.
+        """
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        statement = (
+            select(cls)
+            .join(items_fts, items_fts.c.rowid == cls.item_id)
+            .where(fts_match(expression))
+            .options(*FREEBIE_DETAILS)
+            .order_by(items_fts.c.rank, cls.id)
+            .limit(limit)
+        )
+        if company is not None:
+            statement = statement.where(cls.company_id == getattr(company, 'id', company))
+        if dev is not None:
+            statement = statement.where(cls.dev_id == getattr(dev, 'id', dev))
+        with session_scope(session) as session:
+            return session.scalars(statement).all()
+
     def print_details(self):
         """Returns a formatted string with freebie details"""
         return f"{self.dev.name} owns a {self.item_name} from {self.company.name}"
 
 
+
+class CompanyDev(Base):
+    """One row per (company, dev) pair with how many freebies link them"""
+    __tablename__ = 'company_devs'
+
+    company_id = Column(Integer(), ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    dev_id = Column(Integer(), ForeignKey('devs.id', ondelete='CASCADE'), primary_key=True, index=True)
+    freebie_count = Column(Integer(), nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<CompanyDev {self.company_id}-{self.dev_id}: {self.freebie_count}>'
+
+
+class FreebieEvent(Base):
+    """One create, transfer or delete of a freebie, appended by the triggers in events.py
+
+    seq only ever grows: AUTOINCREMENT never hands out a number again, even
+    after compaction deletes the rows that held it. There are no foreign
+    keys, since events outlive the rows they describe.
+    """
+    __tablename__ = 'freebie_events'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = Column(Integer(), primary_key=True)
+    kind = Column(String(), nullable=False)
+    freebie_id = Column(Integer(), nullable=False)
+    company_id = Column(Integer(), nullable=False)
+    item_id = Column(Integer(), nullable=False)
+    value = Column(Integer(), nullable=False)
+    from_dev_id = Column(Integer())
+    to_dev_id = Column(Integer())
+    recorded_at = Column(DateTime(), nullable=False, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<FreebieEvent {self.seq} {self.kind} {self.freebie_id}: {self.from_dev_id}->{self.to_dev_id}>'
+
+
+class EventCheckpoint(Base):
+    """The last freebie_events seq a named consumer has processed"""
+    __tablename__ = 'event_checkpoints'
+
+    consumer = Column(String(), primary_key=True)
+    last_seq = Column(Integer(), nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(), nullable=False, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<EventCheckpoint {self.consumer}: {self.last_seq}>'
+
+
+# create_all() (seed.py, synthetic.py) installs the counter and event
+# triggers and the search index too
+for _ddl in [*TRIGGERS.values(), *events.TRIGGERS.values()]:
+    event.listen(Freebie.__table__, 'after_create', DDL(_ddl).execute_if(dialect='sqlite'))
+for _ddl in [search.CREATE_TABLE, *search.TRIGGERS.values()]:
+    event.listen(Item.__table__, 'after_create', DDL(_ddl).execute_if(dialect='sqlite'))
+
+
+def ensure_schema(engine=None):
+    """Runs create_all() unless alembic already has the database at head
+
+    Returns True if create_all() ran. Skipping it saves reflecting every
+    table on each start of a short-lived job.
+    """
+    engine = engine or get_engine()
+    if schema_is_current(engine):
+        return False
+    Base.metadata.create_all(engine)
+    return True
+
+
+# Dev columns the counter triggers rewrite when a freebie changes hands
+DEV_COUNTERS = ['freebie_count', 'total_value', 'distinct_company_count']
+
+
+# Loader options for listing freebies with what print_details() touches.
+# Many-to-ones are joined into the same SELECT; collections use one extra
+# SELECT ... IN per batch of parents rather than one per parent. The item is
+# named explicitly so raiseload('*') in async_db.py does not override it.
+FREEBIE_DETAILS = (joinedload(Freebie.item), joinedload(Freebie.dev), joinedload(Freebie.company))
+COMPANY_WITH_FREEBIES = (selectinload(Company.freebies).options(joinedload(Freebie.item), joinedload(Freebie.dev)),)
+DEV_WITH_FREEBIES = (selectinload(Dev.freebies).options(joinedload(Freebie.item), joinedload(Freebie.company)),)
+
+
+def render_details(query=None, session=None, yield_per=1000):
+    """Yields print_details() lines for a Freebie query from one joined SELECT
+
+    query may be a select(Freebie) statement or a session.query(Freebie);
+    rows are streamed yield_per at a time rather than loaded all at once.
+    """
+    if isinstance(query, Query):
+        for freebie in query.options(*FREEBIE_DETAILS).yield_per(yield_per):
+            yield freebie.print_details()
+        return
+    statement = Freebie.details_select() if query is None else query.options(*FREEBIE_DETAILS)
+    with session_scope(session) as session:
+        for freebie in session.scalars(statement.execution_options(yield_per=yield_per)):
+            yield freebie.print_details()
+
+
+def transfer_freebies(freebie_ids, from_dev, to_dev):
+    """Moves the given freebies from from_dev to to_dev in bulk
+
+    Ownership is enforced in SQL: ids not belonging to from_dev are left
+    alone. Runs one UPDATE per 500 ids and returns the number moved.
+    """
+    freebie_ids = set(freebie_ids)
+    return _move_freebies(from_dev, to_dev, [
+        [Freebie.dev_id == from_dev.id, Freebie.id.in_(chunk)] for chunk in in_chunks(freebie_ids)
+    ], lambda freebie: freebie.id in freebie_ids)
+
+
+def _move_freebies(from_dev, to_dev, criteria_batches, matches=None):
+    """Runs UPDATE freebies SET dev_id per criteria batch and syncs loaded objects
+
+    Freebies already in the identity map get their dev/dev_id updated in
+    place, and any loaded Dev.freebies collections are patched rather than
+    expired, so nothing has to be reloaded. The trigger-maintained counters
+    on both devs and on the freebies' companies are expired instead.
+
+    A from_dev outside a session has only its in-memory freebies; those for
+    which matches(freebie) is true are handed over one by one. Without
+    matches, the criteria cannot be applied and ValueError is raised.
+    """
+    session = object_session(from_dev)
+    if session is None:
+        if matches is None:
+            raise ValueError(f"{from_dev!r} is not in a session, so a SQL filter cannot select its freebies")
+        moving = [freebie for freebie in from_dev.freebies if matches(freebie)]
+        for freebie in moving:
+            freebie.dev = to_dev
+        return len(moving)
+    session.flush()
+
+    moved_ids, company_ids = set(), set()
+    for criteria in criteria_batches:
+        statement = (
+            update(Freebie)
+            .where(*criteria)
+            .values(dev_id=to_dev.id)
+            .returning(Freebie.id, Freebie.company_id)
+            .execution_options(synchronize_session=False)
+        )
+        for freebie_id, company_id in session.execute(statement):
+            moved_ids.add(freebie_id)
+            company_ids.add(company_id)
+    if not moved_ids:
+        return 0
+
+    for dev in (from_dev, to_dev):
+        session.expire(dev, DEV_COUNTERS)
+
+    moved = {}
+    for key, obj in list(session.identity_map.items()):
+        if isinstance(obj, Freebie) and obj.id in moved_ids:
+            set_committed_value(obj, 'dev_id', to_dev.id)
+            set_committed_value(obj, 'dev', to_dev)
+            moved[obj.id] = obj
+        elif isinstance(obj, Company) and obj.id in company_ids:
+            session.expire(obj, ['distinct_dev_count'])
+
+    if 'freebies' in from_dev.__dict__:
+        set_committed_value(from_dev, 'freebies', [
+            freebie for freebie in from_dev.freebies if freebie.id not in moved_ids
+        ])
+    if 'freebies' in to_dev.__dict__:
+        missing = moved_ids - moved.keys()
+        for chunk in in_chunks(missing):
+            for freebie in session.query(Freebie).filter(Freebie.id.in_(chunk)):
+                moved[freebie.id] = freebie
+        set_committed_value(to_dev, 'freebies', list(to_dev.freebies) + [
+            moved[freebie_id] for freebie_id in sorted(moved_ids)
+        ])
+
+    _invalidate_item_name_cache(from_dev)
+    _invalidate_item_name_cache(to_dev)
+    return len(moved_ids)
+
+
+def _invalidate_item_name_cache(dev):
+    """Drops a dev's cached item names, if it has any"""
+    if isinstance(dev, Dev):
+        dev.__dict__.pop('_item_name_cache', None)
+
+
+@event.listens_for(Freebie.dev, 'set')
+def _freebie_dev_changed(freebie, dev, old_dev, initiator):
+    """A freebie changing hands (give_freebie, give_away) stales both devs' caches"""
+    _invalidate_item_name_cache(dev)
+    _invalidate_item_name_cache(old_dev)
+
+
+@event.listens_for(Freebie.item, 'set')
+def _freebie_item_changed(freebie, item, old_item, initiator):
+    """Renaming a freebie stales its owner's cache"""
+    _invalidate_item_name_cache(freebie.__dict__.get('dev'))
+
+
+@event.listens_for(Dev, 'expire')
+def _dev_expired(dev, attrs):
+    """Commit, rollback and session.expire() reload the dev, so reload its item names too"""
+    _invalidate_item_name_cache(dev)
+
+
+@event.listens_for(Session, 'persistent_to_deleted')
+def _freebie_deleted(session, instance):
+    """A deleted freebie stales its owner's cache; a deleted company, through
+    ON DELETE CASCADE, may stale any dev's"""
+    if isinstance(instance, Freebie):
+        dev_key = session.identity_key(Dev, instance.__dict__.get('dev_id'))
+        _invalidate_item_name_cache(session.identity_map.get(dev_key))
+    elif isinstance(instance, Company):
+        _invalidate_all_item_name_caches(session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _freebies_bulk_changed(orm_execute_state):
+    """A bulk DELETE or UPDATE does not say whose freebies it touched, so every
+    cache is dropped"""
+    if orm_execute_state.is_delete or orm_execute_state.is_update:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (Freebie, Company):
+            _invalidate_all_item_name_caches(orm_execute_state.session)
+
+
+def _invalidate_all_item_name_caches(session):
+    for obj in list(session.identity_map.values()):
+        _invalidate_item_name_cache(obj)
+
+
+@event.listens_for(Session, 'before_flush')
+def _intern_new_items(session, flush_context, instances):
+    """Points freebies at the items row for each newly assigned name
+
+    Setting Freebie.item_name creates a placeholder Item. Here the pending
+    names are added to the catalog with INSERT ... ON CONFLICT DO NOTHING,
+    in the flush's own transaction, and every placeholder is swapped for
+    the catalog row, so items keeps one row per name even when concurrent
+    sessions add the same new name. Costs one INSERT and one SELECT per
+    500 new names per flush.
+    """
+    pending = [obj for obj in session.new if isinstance(obj, Item)]
+    if not pending:
+        return
+    connection = session.connection()
+    canonical = {}
+    for chunk in in_chunks({item.name for item in pending}):
+        connection.execute(
+            sqlite_insert(Item).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name} for name in chunk],
+        )
+        canonical.update((item.name, item) for item in session.scalars(select(Item).where(Item.name.in_(chunk))))
+    pending = set(pending)
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Freebie) and obj.item in pending:
+            obj.item = canonical[obj.item.name]
+    for item in pending:
+        session.expunge(item)
+
+
 # Test the models if run directly
 if __name__ == "__main__":
     print(" Models loaded successfully!")
-    print("Available models: Company, Dev, Freebie")
+    print("Available models: Company, Dev, Freebie, Item")
     
     # Test database connection
     try:
-        db_path = os.path.join(os.path.dirname(__file__), 'freebies.db')
-        engine = create_engine(f'sqlite:///{db_path}')
+        engine = get_engine()
+        db_path = engine.url.database
         
         # Test if we can connect
         with engine.connect() as conn:
             print(f" Database connection successful: {db_path}")
             
         # Check if tables exist
-        if os.path.exists(db_path):
-            Session = sessionmaker(bind=engine)
-            session = Session()
+        if db_path and os.path.exists(db_path):
+            session = new_session()
             
             try:
                 company_count = session.query(Company).count()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""Online, chunked table rebuilds for migrations on large SQLite tables
+
+op.batch_alter_table() rebuilds a table by copying every row in one
+transaction, which holds SQLite's write lock for the whole copy. An online
+rebuild builds the new table as a shadow (_online_<table>) and copies rows
+in rowid chunks, one short transaction each, so other writers get in
+between chunks:
+
+  1. prepare: create the shadow with the new schema and its indexes, plus
+     triggers on the live table that mirror every insert, update and delete
+     into the shadow
+  2. copy: INSERT OR REPLACE rowid ranges up to the rowid that was highest
+     at prepare time, pausing between chunks. Rows written later reach the
+     shadow via the triggers. The last copied rowid is saved with each chunk.
+  3. swap: check the shadow's foreign keys, then in one transaction drop
+     the live table, rename the shadow into place and put back the table's
+     triggers and planner statistics
+  4. finish: indexes whose names were still taken by the live table were
+     built under a temporary name. Each is now rebuilt under its real name,
+     one transaction per index.
+
+A rebuild that dies part way leaves its shadow, triggers and progress row
+behind. Running it again resumes from the last committed chunk. Use
+python online_migration.py --abort <table> to throw it away instead.
+Everything before rebuild_table() in the same migration is committed
+first, so keep it idempotent or put the rebuild in its own revision.
+
+In a migration script:
+
+    from online_migration import rebuild_table
+
+    def upgrade():
+        rebuild_table(op, 'freebies',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            ...
+            sa.Index('ix_freebies_item_id', 'item_id'),
+            copy_from={'item_id': "(SELECT id FROM items WHERE name = item_name)"},
+        )
+
+Usage (from the lib directory):
+    python online_migration.py            list rebuilds in progress
+    python online_migration.py --abort freebies
+"""
+
+import argparse
+from contextlib import contextmanager
+import time
+
+from alembic.operations.schemaobj import SchemaObjects
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from database import get_engine
+
+DEFAULT_CHUNK_SIZE = 20000
+# Seconds between chunks. SQLite's busy handler sleeps up to 100ms between
+# retries, so shorter gaps let the next chunk take the lock before a
+# waiting writer wakes up.
+DEFAULT_PAUSE = 0.1
+SHADOW_PREFIX = '_online_'
+STATE_TABLE = '_online_migrations'
+
+CREATE_STATE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        table_name VARCHAR PRIMARY KEY,
+        last_rowid INTEGER NOT NULL,
+        max_rowid INTEGER NOT NULL,
+        temp_indexes VARCHAR NOT NULL DEFAULT ''
+    )
+"""
+
+
+@contextmanager
+def _immediate(engine):
+    """Yields a connection inside BEGIN IMMEDIATE, committed on exit
+
+    pysqlite only opens transactions implicitly before DML, so DDL would
+    otherwise autocommit statement by statement. Foreign keys are switched
+    off so DROP TABLE does not cascade into child tables.
+    """
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def _forget(connection, table_name):
+    """Deletes table_name's progress row, and the progress table once it is empty"""
+    connection.execute(sa.text(f"DELETE FROM {STATE_TABLE} WHERE table_name = :name"), {'name': table_name})
+    if connection.exec_driver_sql(f"SELECT 1 FROM {STATE_TABLE} LIMIT 1").first() is None:
+        connection.exec_driver_sql(f"DROP TABLE {STATE_TABLE}")
+
+
+def print_progress(copied, rowid, max_rowid, elapsed):
+    """Default progress report: rows copied this run, rowid reached and throughput"""
+    rate = copied / elapsed if elapsed else 0.0
+    share = rowid / max_rowid if max_rowid else 1.0
+    print(f"  {copied:,} rows copied, up to rowid {rowid:,} of {max_rowid:,} ({share:.0%}) "
+          f"in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+
+
+class TableRebuild:
+    """Rebuilds table_name as new_table by shadow copy, chunk_size rows per transaction
+
+    new_table is an sa.Table with the target name, columns, constraints and
+    indexes. copy_from maps a new column to a SQL expression over the old
+    row; other columns are copied by name. triggers is DDL to create on the
+    rebuilt table; by default the table's current triggers are recreated
+    as they are.
+    """
+
+    def __init__(self, engine, new_table, copy_from=None, triggers=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, pause=DEFAULT_PAUSE, progress=None):
+        self.engine = engine
+        self.table = new_table
+        self.name = new_table.name
+        self.shadow_name = SHADOW_PREFIX + self.name
+        self.copy_from = dict(copy_from or {})
+        self.triggers = None if triggers is None else list(triggers)
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.progress = progress
+        self.columns = [column.name for column in new_table.columns]
+        self.expressions = [self.copy_from.get(name, f'"{name}"') for name in self.columns]
+
+    @property
+    def capture_triggers(self):
+        """Triggers on the live table that keep the shadow's copied rows current"""
+        columns = ', '.join(f'"{name}"' for name in self.columns)
+        select = f"SELECT {', '.join(self.expressions)} FROM \"{self.name}\" WHERE rowid = NEW.rowid"
+        prefix = f'{SHADOW_PREFIX}{self.name}'
+        return {
+            f'{prefix}_insert': f"""
+                CREATE TRIGGER "{prefix}_insert" AFTER INSERT ON "{self.name}" BEGIN
+                    INSERT OR REPLACE INTO "{self.shadow_name}" ({columns}) {select};
+                END""",
+            f'{prefix}_update': f"""
+                CREATE TRIGGER "{prefix}_update" AFTER UPDATE ON "{self.name}" BEGIN
+                    DELETE FROM "{self.shadow_name}" WHERE rowid = OLD.rowid;
+                    INSERT OR REPLACE INTO "{self.shadow_name}" ({columns}) {select};
+                END""",
+            f'{prefix}_delete': f"""
+                CREATE TRIGGER "{prefix}_delete" AFTER DELETE ON "{self.name}" BEGIN
+                    DELETE FROM "{self.shadow_name}" WHERE rowid = OLD.rowid;
+                END""",
+        }
+
+    def run(self):
+        """Runs every step, resuming a rebuild left unfinished; returns timing stats"""
+        start = time.perf_counter()
+        state = self.prepare()
+        copied = self.copy(state)
+        self.check()
+        copy_seconds = time.perf_counter() - start
+        swap_start = time.perf_counter()
+        temp_indexes = self.swap()
+        swap_seconds = time.perf_counter() - swap_start
+        finish_start = time.perf_counter()
+        self.finish(temp_indexes)
+        return {
+            'rows': copied,
+            'seconds': time.perf_counter() - start,
+            'copy_seconds': copy_seconds,
+            'swap_seconds': swap_seconds,
+            'finish_seconds': time.perf_counter() - finish_start,
+        }
+
+    def _state(self, connection):
+        return connection.execute(
+            sa.text(f"SELECT last_rowid, max_rowid, temp_indexes FROM {STATE_TABLE} WHERE table_name = :name"),
+            {'name': self.name},
+        ).first()
+
+    def prepare(self):
+        """Creates the shadow, its indexes and the capture triggers, unless resuming"""
+        with _immediate(self.engine) as connection:
+            connection.exec_driver_sql(CREATE_STATE_TABLE)
+            state = self._state(connection)
+            if state is not None:
+                return state
+
+            shadow = self.table.to_metadata(self.table.metadata, name=self.shadow_name)
+            connection.execute(CreateTable(shadow))
+            taken = set(connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+            temp_indexes = []
+            for index in self.table.indexes:
+                name = index.name
+                if name in taken:
+                    # Index names are global, so this one waits for finish()
+                    name = f'{SHADOW_PREFIX}{index.name}'
+                    temp_indexes.append(index.name)
+                connection.execute(CreateIndex(sa.Index(
+                    name, *[shadow.c[column.name] for column in index.columns], unique=index.unique,
+                )))
+            for ddl in self.capture_triggers.values():
+                connection.exec_driver_sql(ddl)
+            max_rowid = connection.exec_driver_sql(f'SELECT MAX(rowid) FROM "{self.name}"').scalar() or 0
+            connection.execute(
+                sa.text(f"INSERT INTO {STATE_TABLE} VALUES (:name, 0, :max_rowid, :temp_indexes)"),
+                {'name': self.name, 'max_rowid': max_rowid, 'temp_indexes': ','.join(temp_indexes)},
+            )
+            return self._state(connection)
+
+    def copy(self, state):
+        """Copies rowid chunks up to max_rowid, saving progress with each; returns rows copied"""
+        last_rowid, max_rowid, _ = state
+        columns = ', '.join(f'"{name}"' for name in self.columns)
+        copy_chunk = sa.text(
+            f'INSERT OR REPLACE INTO "{self.shadow_name}" ({columns}) '
+            f'SELECT {", ".join(self.expressions)} FROM "{self.name}" '
+            f'WHERE rowid > :low AND rowid <= :high ORDER BY rowid'
+        )
+        save = sa.text(f"UPDATE {STATE_TABLE} SET last_rowid = :high WHERE table_name = :name")
+        copied = 0
+        start = time.perf_counter()
+        while last_rowid < max_rowid:
+            high = min(last_rowid + self.chunk_size, max_rowid)
+            with _immediate(self.engine) as connection:
+                copied += connection.execute(copy_chunk, {'low': last_rowid, 'high': high}).rowcount
+                connection.execute(save, {'high': high, 'name': self.name})
+            last_rowid = high
+            if self.progress:
+                self.progress(copied, high, max_rowid, time.perf_counter() - start)
+            if last_rowid < max_rowid:
+                time.sleep(self.pause)
+        return copied
+
+    def check(self):
+        """Raises if copied rows break the new table's foreign keys
+
+        Runs before the swap on a read transaction, which in WAL mode does
+        not hold up writers.
+        """
+        with self.engine.connect() as connection:
+            violations = connection.exec_driver_sql(
+                f'PRAGMA foreign_key_check("{self.shadow_name}")').fetchall()
+        if violations:
+            raise RuntimeError(f"{len(violations)} rows of {self.shadow_name} fail their foreign keys, "
+                               f"first: rowid {violations[0][1]} -> {violations[0][2]}")
+
+    def swap(self):
+        """Replaces the live table with the shadow in one transaction; returns the temp index names"""
+        with _immediate(self.engine) as connection:
+            _, _, temp_indexes = self._state(connection)
+            triggers = self.triggers
+            if triggers is None:
+                triggers = connection.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name NOT LIKE ?",
+                    (self.name, f'{SHADOW_PREFIX}%'),
+                ).scalars().all()
+            stats = self._kept_stats(connection)
+            for name in self.capture_triggers:
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{name}"')
+            connection.exec_driver_sql(f'DROP TABLE "{self.name}"')
+            connection.exec_driver_sql(f'ALTER TABLE "{self.shadow_name}" RENAME TO "{self.name}"')
+            for ddl in triggers:
+                connection.exec_driver_sql(str(ddl))
+            if stats:
+                connection.exec_driver_sql(
+                    "INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)", stats)
+            _forget(connection, self.name)
+        return [name for name in temp_indexes.split(',') if name]
+
+    def _kept_stats(self, connection):
+        """ANALYZE results for the live table still true of the shadow
+
+        DROP TABLE deletes them, and without them the planner can pick
+        slow plans until the next ANALYZE. The row count is kept, as are
+        the stats of indexes whose columns are unchanged.
+        """
+        has_stats = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").first()
+        if not has_stats:
+            return []
+        new_columns = {index.name: [column.name for column in index.columns] for index in self.table.indexes}
+        kept = []
+        for idx, stat in connection.exec_driver_sql(
+                "SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ?", (self.name,)).fetchall():
+            if idx is not None:
+                old_columns = [row[2] for row in connection.exec_driver_sql(f'PRAGMA index_info("{idx}")')]
+                if new_columns.get(idx) != old_columns:
+                    continue
+            kept.append((self.name, idx, stat))
+        return kept
+
+    def finish(self, temp_indexes):
+        """Rebuilds each temporarily named index under its real name"""
+        indexes = {index.name: index for index in self.table.indexes}
+        for name in temp_indexes:
+            with _immediate(self.engine) as connection:
+                connection.execute(CreateIndex(indexes[name]))
+                connection.exec_driver_sql(f'DROP INDEX "{SHADOW_PREFIX}{name}"')
+
+
+def rebuild_table(op, table_name, *elements, copy_from=None, triggers=None, chunk_size=None,
+                  pause=None, progress=print_progress):
+    """Rebuilds table_name with the given columns, constraints and indexes, online
+
+    For use in migration scripts in place of op.batch_alter_table(). elements
+    are what op.create_table() takes, with sa.Index entries for the
+    indexes. env.py passes -x online_chunk_size=N and -x online_pause=SECONDS
+    through, and -x online_migrations=false turns this into a
+    single-transaction copy.
+    In offline (--sql) mode the copy is emitted as one INSERT ... SELECT,
+    and triggers must be given, since the live schema cannot be read.
+    """
+    context = op.get_context()
+    options = context.opts.get('online_migration', {})
+    chunk_size = chunk_size or options.get('chunk_size') or DEFAULT_CHUNK_SIZE
+    if pause is None:
+        pause = options.get('pause', DEFAULT_PAUSE)
+    # Adds stub tables for foreign key targets, as op.create_table() does
+    new_table = SchemaObjects(context).table(table_name, *elements)
+
+    if context.as_sql or not options.get('enabled', True):
+        if triggers is None and context.as_sql:
+            raise ValueError("rebuild_table() needs triggers= when generating SQL offline")
+        _rebuild_in_one_transaction(op, new_table, copy_from or {}, triggers)
+        return
+
+    # Chunks commit on their own connections, so the migration's open
+    # transaction must not hold the write lock meanwhile
+    with context.autocommit_block():
+        rebuild = TableRebuild(op.get_bind().engine, new_table, copy_from, triggers, chunk_size, pause, progress)
+        rebuild.run()
+
+
+def _rebuild_in_one_transaction(op, new_table, copy_from, triggers):
+    """The batch-style rebuild: shadow, one INSERT ... SELECT, drop, rename"""
+    name = new_table.name
+    shadow = new_table.to_metadata(new_table.metadata, name=SHADOW_PREFIX + name)
+    columns = [column.name for column in new_table.columns]
+    quoted = [f'"{column}"' for column in columns]
+    expressions = [copy_from.get(column, f'"{column}"') for column in columns]
+    if triggers is None:
+        triggers = op.get_bind().exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (name,)
+        ).scalars().all()
+    op.execute(CreateTable(shadow))
+    op.execute(
+        f'INSERT INTO "{shadow.name}" ({", ".join(quoted)}) '
+        f'SELECT {", ".join(expressions)} FROM "{name}"'
+    )
+    op.execute(f'DROP TABLE "{name}"')
+    op.execute(f'ALTER TABLE "{shadow.name}" RENAME TO "{name}"')
+    for index in new_table.indexes:
+        op.execute(CreateIndex(index))
+    for ddl in triggers:
+        op.execute(str(ddl))
+
+
+def rebuilds_in_progress(engine=None):
+    """Returns (table, last_rowid, max_rowid) for every unfinished rebuild"""
+    engine = engine or get_engine()
+    with engine.connect() as connection:
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (STATE_TABLE,)).first()
+        if not exists:
+            return []
+        return connection.exec_driver_sql(
+            f"SELECT table_name, last_rowid, max_rowid FROM {STATE_TABLE}").fetchall()
+
+
+def abort_rebuild(table_name, engine=None):
+    """Drops an unfinished rebuild's shadow table, capture triggers and progress row"""
+    engine = engine or get_engine()
+    with _immediate(engine) as connection:
+        for action in ('insert', 'update', 'delete'):
+            connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{SHADOW_PREFIX}{table_name}_{action}"')
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{SHADOW_PREFIX}{table_name}"')
+        connection.exec_driver_sql(CREATE_STATE_TABLE)
+        _forget(connection, table_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--abort', metavar='TABLE', help="Discard the unfinished rebuild of TABLE")
+    args = parser.parse_args()
+
+    if args.abort:
+        abort_rebuild(args.abort)
+        print(f" Discarded the online rebuild of {args.abort}")
+    else:
+        rebuilds = rebuilds_in_progress()
+        if not rebuilds:
+            print(" No online rebuilds in progress")
+        for table_name, last_rowid, max_rowid in rebuilds:
+            share = last_rowid / max_rowid if max_rowid else 1.0
+            print(f"  {table_name}: copied up to rowid {last_rowid:,} of {max_rowid:,} ({share:.0%})")
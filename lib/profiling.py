@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Opt-in SQL instrumentation for the models
+
+While a profile is active every statement sent to SQLite is recorded with
+its time, row count and the call site that issued it: the innermost frame
+in models.py if there is one, otherwise the first frame outside SQLAlchemy.
+Rows are the cursor rowcount for writes and the rows actually fetched for
+SELECTs. The same SQL repeated from the same call site is reported as a
+likely N+1 lazy load.
+
+    with profile_queries(output='queries.prom') as profile:
+        debug.test_relationships_and_methods()
+    print(profile.report())
+
+Exports are JSON or Prometheus text format, picked by file extension.
+
+Usage (from the lib directory):
+    python profiling.py [--output queries.json]   profile debug.py's test run
+"""
+
+import argparse
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_FILE = os.path.join(LIB_DIR, 'models.py')
+_SKIPPED_FILES = (os.path.abspath(__file__), os.path.join(LIB_DIR, 'database.py'))
+
+
+def _call_site():
+    """Returns 'file:Qualified.name' for the code that caused the statement"""
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename == MODELS_FILE:
+            return f"models.py:{frame.f_code.co_qualname}"
+        if fallback is None and 'sqlalchemy' not in filename and filename not in _SKIPPED_FILES \
+                and not filename.startswith('<'):
+            fallback = f"{os.path.basename(filename)}:{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+def _statement_id(sql):
+    return hashlib.sha1(sql.encode()).hexdigest()[:12]
+
+
+class _CountingCursor:
+    """Wraps a DBAPI cursor and adds the rows fetched through it to stats.rows"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+
+class StatementStats:
+    """Aggregate timings for one SQL string issued from one call site"""
+
+    def __init__(self, sql, call_site):
+        self.sql = sql
+        self.call_site = call_site
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {
+            'id': _statement_id(self.sql),
+            'sql': self.sql,
+            'call_site': self.call_site,
+            'count': self.count,
+            'total_seconds': self.total_time,
+            'max_seconds': self.max_time,
+            'rows': self.rows,
+        }
+
+
+class QueryProfiler:
+    """Records every statement executed by engine (or by all engines if None)"""
+
+    def __init__(self, engine=None, slow_threshold=0.05, n_plus_one_threshold=5):
+        self.target = engine if engine is not None else Engine
+        self.slow_threshold = slow_threshold
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.stats = {}
+        self.slow_queries = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._started_at = None
+
+    def start(self):
+        event.listen(self.target, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(self.target, 'after_cursor_execute', self._after_cursor_execute)
+        self._started_at = time.perf_counter()
+        return self
+
+    def stop(self):
+        event.remove(self.target, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(self.target, 'after_cursor_execute', self._after_cursor_execute)
+        self.elapsed += time.perf_counter() - self._started_at
+
+    # Event handlers
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['profile_query_start'].pop()
+        call_site = _call_site()
+        with self._lock:
+            stats = self.stats.get((statement, call_site))
+            if stats is None:
+                stats = self.stats[(statement, call_site)] = StatementStats(statement, call_site)
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            if cursor.description is None and cursor.rowcount > 0:
+                stats.rows += cursor.rowcount
+            if elapsed >= self.slow_threshold:
+                self.slow_queries.append({
+                    'sql': statement,
+                    'parameters': repr(parameters),
+                    'call_site': call_site,
+                    'seconds': elapsed,
+                })
+        if cursor.description is not None and context is not None:
+            # The result about to be built fetches through context.cursor
+            context.cursor = _CountingCursor(cursor, stats)
+
+    # Results
+
+    @property
+    def statement_count(self):
+        return sum(stats.count for stats in self.stats.values())
+
+    @property
+    def total_time(self):
+        return sum(stats.total_time for stats in self.stats.values())
+
+    def n_plus_one(self):
+        """Statements repeated from one call site at least n_plus_one_threshold times"""
+        suspects = [stats for stats in self.stats.values() if stats.count >= self.n_plus_one_threshold]
+        return sorted(suspects, key=lambda stats: stats.count, reverse=True)
+
+    def as_dict(self):
+        return {
+            'elapsed_seconds': self.elapsed,
+            'statement_count': self.statement_count,
+            'sql_seconds': self.total_time,
+            'statements': [stats.as_dict() for stats in
+                           sorted(self.stats.values(), key=lambda stats: stats.total_time, reverse=True)],
+            'slow_queries': self.slow_queries,
+            'n_plus_one': [stats.as_dict() for stats in self.n_plus_one()],
+        }
+
+    def to_prometheus(self):
+        """Returns the per-statement counters in Prometheus text exposition format"""
+        metrics = [
+            ('freebies_sql_statements_total', 'counter', 'Statements executed', 'count'),
+            ('freebies_sql_seconds_total', 'counter', 'Time spent executing statements', 'total_time'),
+            ('freebies_sql_max_seconds', 'gauge', 'Slowest single execution', 'max_time'),
+            ('freebies_sql_rows_total', 'counter', 'Rows written or fetched', 'rows'),
+        ]
+        lines = []
+        for name, kind, help_text, attribute in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stats in self.stats.values():
+                call_site = stats.call_site.replace('\\', '\\\\').replace('"', '\\"')
+                labels = f'statement="{_statement_id(stats.sql)}",call_site="{call_site}"'
+                lines.append(f"{name}{{{labels}}} {getattr(stats, attribute)}")
+        lines.append("# HELP freebies_sql_n_plus_one Statements repeated from a single call site")
+        lines.append("# TYPE freebies_sql_n_plus_one gauge")
+        lines.append(f"freebies_sql_n_plus_one {len(self.n_plus_one())}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """Writes Prometheus text for .prom/.txt paths, JSON otherwise"""
+        with open(path, 'w') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.as_dict(), f, indent=2)
+
+    def report(self, top=10):
+        """Returns a human-readable summary of the profile"""
+        lines = [f" {self.statement_count} statements, {self.total_time * 1000:.1f}ms in SQL "
+                 f"of {self.elapsed * 1000:.1f}ms elapsed"]
+        lines.append(" Most expensive:")
+        for stats in sorted(self.stats.values(), key=lambda stats: stats.total_time, reverse=True)[:top]:
+            sql = ' '.join(stats.sql.split())
+            lines.append(f"   {stats.count:5}x {stats.total_time * 1000:8.2f}ms  {stats.call_site}  {sql[:80]}")
+        for stats in self.n_plus_one():
+            lines.append(f" Possible N+1: {stats.count} identical statements from {stats.call_site}")
+        for slow in self.slow_queries:
+            lines.append(f" Slow ({slow['seconds'] * 1000:.1f}ms) from {slow['call_site']}: "
+                         f"{' '.join(slow['sql'].split())[:80]}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profile_queries(engine=None, output=None, **kwargs):
+    """Profiles the statements run inside the block, exporting to output if given"""
+    profiler = QueryProfiler(engine, **kwargs).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        if output:
+            profiler.export(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="Write the profile to this .json or .prom file")
+    parser.add_argument('--slow-ms', type=float, default=50, help="Slow-query threshold")
+    args = parser.parse_args()
+
+    import debug
+
+    with profile_queries(output=args.output, slow_threshold=args.slow_ms / 1000) as profile:
+        debug.test_relationships_and_methods()
+    print()
+    print(profile.report())
+    if args.output:
+        print(f" Profile written to {args.output}")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Checks that the freebie listing APIs issue a constant number of statements
+
+Each listing is run against two synthetic datasets of different sizes and
+the SQL statements it sends are counted. A listing fails if it goes over
+its budget or if its count grows with the data, which is the signature of
+an N+1 lazy load.
+
+Usage (from the lib directory):
+    python query_counts.py
+"""
+
+from contextlib import contextmanager
+import os
+import tempfile
+
+from sqlalchemy import event, select
+
+import database
+import synthetic
+from models import Company, Dev, Freebie, COMPANY_WITH_FREEBIES, DEV_WITH_FREEBIES, render_details
+
+# (companies, devs, freebies) for the small and the large run
+DATASETS = ((5, 20, 200), (20, 200, 2000))
+
+
+@contextmanager
+def count_statements(engine):
+    """Yields a list that collects every SQL statement engine executes"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def listing_apis():
+    """Returns (label, budget, fn(session)) for each listing; fn touches what callers print"""
+    def freebie_details(session):
+        return [freebie.print_details() for freebie in Freebie.list_details(session)]
+
+    def rendered_details(session):
+        return list(render_details(select(Freebie), session, yield_per=100))
+
+    def rendered_query(session):
+        return list(render_details(session.query(Freebie), yield_per=100))
+
+    def companies_with_freebies(session):
+        return [(company.name, [(freebie.item_name, freebie.dev.name) for freebie in company.freebies])
+                for company in session.scalars(select(Company).options(*COMPANY_WITH_FREEBIES))]
+
+    def devs_with_freebies(session):
+        return [(dev.name, [(freebie.item_name, freebie.company.name) for freebie in dev.freebies])
+                for dev in session.scalars(select(Dev).options(*DEV_WITH_FREEBIES))]
+
+    return [
+        ("Freebie.list_details", 1, freebie_details),
+        ("render_details(select)", 1, rendered_details),
+        ("render_details(Query)", 1, rendered_query),
+        ("companies with freebies and devs", 2, companies_with_freebies),
+        ("devs with freebies and companies", 2, devs_with_freebies),
+    ]
+
+
+def measure(engine):
+    """Returns {label: statement count} for every listing API on engine"""
+    counts = {}
+    for label, _, fn in listing_apis():
+        with database.session_scope() as session, count_statements(engine) as statements:
+            fn(session)
+        counts[label] = len(statements)
+    return counts
+
+
+def check_query_counts():
+    """Prints the verdict for every listing API and returns the failing labels"""
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for companies, devs, freebies in DATASETS:
+            engine = database.configure_engine(f"sqlite:///{os.path.join(tmp, f'counts{freebies}.db')}")
+            synthetic.populate(engine, companies=companies, devs=devs, freebies=freebies)
+            runs.append(measure(engine))
+            engine.dispose()
+    database.configure_engine()
+
+    failures = []
+    for label, budget, _ in listing_apis():
+        counts = [run[label] for run in runs]
+        if max(counts) > budget or len(set(counts)) > 1:
+            failures.append(label)
+            print(f"  FAIL {label}: {' -> '.join(map(str, counts))} statements (budget {budget})")
+        else:
+            print(f"  ok   {label}: {counts[0]} statements")
+    return failures
+
+
+if __name__ == '__main__':
+    print("Counting statements issued by the listing APIs...")
+    failed = check_query_counts()
+    if failed:
+        print(f" {len(failed)} listings issue more statements than their budget")
+        exit(1)
+    print(" All listings issue a constant number of statements")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+from sqlalchemy import delete, select, text, tuple_
+
+from models import Company, Dev, Freebie, FreebieEvent
+from search import items_fts, fts_match
+from database import get_engine
+
+
+def hot_queries():
+    """Returns (label, statement) pairs for the queries the models issue most"""
+    return [
+        ("Company.freebies", select(Freebie).where(Freebie.company_id == 1)),
+        ("Dev.freebies", select(Freebie).where(Freebie.dev_id == 1)),
+        ("Dev.received_one", select(Freebie.id).where(
+            Freebie.dev_id == 1, Freebie.item_name == 'ODM T-shirts')),
+        ("Freebie by item_name", select(Freebie).where(Freebie.item_name == 'ODM T-shirts')),
+        ("Company.devs", select(Dev).where(Dev.id.in_(
+            select(Freebie.dev_id).where(Freebie.company_id == 1)))),
+        ("Dev.companies", select(Company).where(Company.id.in_(
+            select(Freebie.company_id).where(Freebie.dev_id == 1)))),
+        ("Company.freebies_page by value", select(Freebie).where(
+            Freebie.company_id == 1, tuple_(Freebie.value, Freebie.id) > tuple_(1000, 1)
+        ).order_by(Freebie.value, Freebie.id).limit(51)),
+        ("Freebie.search", select(Freebie).join(items_fts, items_fts.c.rowid == Freebie.item_id).where(
+            fts_match('"odm"* "ban"*')).order_by(items_fts.c.rank, Freebie.id).limit(20)),
+        ("Company.oldest_company", Company.oldest_company_select()),
+        ("Company by name", select(Company).where(Company.name == 'ODM')),
+        ("Dev by name", select(Dev).where(Dev.name == 'Raila')),
+        ("delete company freebies", delete(Freebie).where(Freebie.company_id == 1)),
+        ("events after checkpoint", select(FreebieEvent).where(FreebieEvent.seq > 1000)
+            .order_by(FreebieEvent.seq).limit(1000)),
+    ]
+
+
+def full_scans(connection, statement):
+    """Returns the EXPLAIN QUERY PLAN steps that scan a table or a whole index
+
+    Only SEARCH steps count as index use. SCAN ... USING [COVERING] INDEX
+    still reads every entry of the index, so it is reported too.
+    """
+    sql = str(statement.compile(connection, compile_kwargs={"literal_binds": True}))
+    plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return [row[-1] for row in plan if row[-1].startswith('SCAN ') and not _is_fts_lookup(row[-1])]
+
+
+def _is_fts_lookup(step):
+    """FTS5 reports a MATCH as a scan of its virtual table with a non-zero index number"""
+    return 'VIRTUAL TABLE INDEX' in step and not step.endswith('INDEX 0:')
+
+
+def check_query_plans(engine=None):
+    """Prints the plan verdict for every hot query and returns the failing labels"""
+    engine = engine or get_engine()
+    failures = []
+    with engine.connect() as connection:
+        for label, statement in hot_queries():
+            scans = full_scans(connection, statement)
+            if scans:
+                failures.append(label)
+                print(f"  FAIL {label}: {', '.join(scans)}")
+            else:
+                print(f"  ok   {label}")
+    return failures
+
+
+if __name__ == '__main__':
+    print("Checking query plans for full table and index scans...")
+    failed = check_query_plans()
+    if failed:
+        print(f" {len(failed)} hot queries do not use an index. Run 'alembic upgrade head'")
+        exit(1)
+    print(" All hot queries use an index")
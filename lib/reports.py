@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""SQL-side rollups over the freebies tables
+
+Every report is a single GROUP BY (or aggregate) query and returns plain
+NamedTuples rather than ORM instances.
+
+Usage (from the lib directory):
+    python reports.py [--top 5]
+"""
+
+import argparse
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func, select
+
+from models import Company, Dev, Freebie, Item
+from database import session_scope
+
+
+class ValueRollup(NamedTuple):
+    id: int
+    name: Optional[str]
+    freebies: int
+    total_value: int
+    average_value: float
+
+
+class TopFreebie(NamedTuple):
+    id: int
+    item_name: str
+    value: int
+    dev_name: Optional[str]
+    company_name: Optional[str]
+
+
+class DevCount(NamedTuple):
+    company_id: int
+    company_name: Optional[str]
+    devs: int
+
+
+class YearBucket(NamedTuple):
+    founding_year: Optional[int]
+    companies: int
+
+
+def total_value(session=None):
+    """Returns the summed value of every freebie"""
+    with session_scope(session) as session:
+        return session.execute(select(func.coalesce(func.sum(Freebie.value), 0))).scalar()
+
+
+def _value_rollup(session, model, foreign_key, limit):
+    """Groups freebies by foreign_key and joins model for the name"""
+    totals = (
+        select(
+            foreign_key.label('id'),
+            func.count().label('freebies'),
+            func.sum(Freebie.value).label('total_value'),
+            func.avg(Freebie.value).label('average_value'),
+        )
+        .group_by(foreign_key)
+        .subquery()
+    )
+    query = (
+        select(totals.c.id, model.name, totals.c.freebies, totals.c.total_value, totals.c.average_value)
+        .join(model, model.id == totals.c.id)
+        .order_by(totals.c.total_value.desc(), totals.c.id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [ValueRollup(*row) for row in session.execute(query)]
+
+
+def value_by_company(session=None, limit=None):
+    """Returns freebie count, total and average value per company, highest total first"""
+    with session_scope(session) as session:
+        return _value_rollup(session, Company, Freebie.company_id, limit)
+
+
+def value_by_dev(session=None, limit=None):
+    """Returns freebie count, total and average value per dev, highest total first"""
+    with session_scope(session) as session:
+        return _value_rollup(session, Dev, Freebie.dev_id, limit)
+
+
+def top_freebies(n=10, session=None):
+    """Returns the n most valuable freebies with their dev and company names"""
+    query = (
+        select(Freebie.id, Item.name, Freebie.value, Dev.name, Company.name)
+        .join(Item, Item.id == Freebie.item_id)
+        .join(Dev, Dev.id == Freebie.dev_id)
+        .join(Company, Company.id == Freebie.company_id)
+        .order_by(Freebie.value.desc(), Freebie.id)
+        .limit(n)
+    )
+    with session_scope(session) as session:
+        return [TopFreebie(*row) for row in session.execute(query)]
+
+
+def distinct_devs_by_company(session=None):
+    """Returns how many different devs collected from each company"""
+    counts = (
+        select(Freebie.company_id, func.count(func.distinct(Freebie.dev_id)).label('devs'))
+        .group_by(Freebie.company_id)
+        .subquery()
+    )
+    query = (
+        select(counts.c.company_id, Company.name, counts.c.devs)
+        .join(Company, Company.id == counts.c.company_id)
+        .order_by(counts.c.devs.desc(), counts.c.company_id)
+    )
+    with session_scope(session) as session:
+        return [DevCount(*row) for row in session.execute(query)]
+
+
+def founding_year_histogram(bucket_size=1, session=None):
+    """Returns company counts per founding year, or per bucket_size-year bucket"""
+    year = Company.founding_year
+    if bucket_size > 1:
+        year = (Company.founding_year // bucket_size) * bucket_size
+    year = year.label('founding_year')
+    query = select(year, func.count()).group_by(year).order_by(year)
+    with session_scope(session) as session:
+        return [YearBucket(*row) for row in session.execute(query)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Total value of all freebies: KSh {total_value():,}")
+
+    print(f"\nTop {args.top} companies by value:")
+    for row in value_by_company(limit=args.top):
+        print(f"  {row.name}: {row.freebies} freebies, KSh {row.total_value:,} "
+              f"(avg KSh {row.average_value:,.0f})")
+
+    print(f"\nTop {args.top} devs by value:")
+    for row in value_by_dev(limit=args.top):
+        print(f"  {row.name}: {row.freebies} freebies, KSh {row.total_value:,}")
+
+    print(f"\nTop {args.top} most valuable freebies:")
+    for row in top_freebies(args.top):
+        print(f"  {row.item_name}: KSh {row.value:,} ({row.dev_name} from {row.company_name})")
+
+    print("\nDistinct devs per company:")
+    for row in distinct_devs_by_company()[:args.top]:
+        print(f"  {row.company_name}: {row.devs}")
+
+    print("\nCompanies by founding year:")
+    for row in founding_year_histogram():
+        print(f"  {row.founding_year}: {row.companies}")
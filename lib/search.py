@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Full-text search over freebie item names with SQLite FTS5
+
+items_fts is an external-content FTS5 table: it indexes items.name by item
+id without storing a second copy of the text. Each distinct name is
+indexed once however many freebies share it, and triggers on items keep it
+in sync for every write path, as the counter triggers do.
+
+Queries are matched word by word as prefixes, so "t-shirt" finds
+"ODM T-shirts" and "ODM ban" finds "ODM Banners". Results are ranked by
+bm25.
+
+Usage (from the lib directory):
+    python search.py "odm ban" [--limit 10]
+    python search.py --rebuild        recreate the index and triggers from items
+"""
+
+import argparse
+import re
+
+from sqlalchemy import literal_column, text
+from sqlalchemy.sql import column, table
+
+from database import get_engine
+
+FTS_TABLE = 'items_fts'
+
+# Lightweight handle for queries; deliberately not in Base.metadata so
+# create_all() and autogenerate leave the virtual table alone
+items_fts = table(FTS_TABLE, column('rowid'), column('name'), column('rank'))
+
+CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name,
+        content='items',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+"""
+
+TRIGGERS = {
+    'trg_items_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_insert AFTER INSERT ON items BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    """,
+    'trg_items_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_delete AFTER DELETE ON items BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        END
+    """,
+    'trg_items_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_update AFTER UPDATE OF name ON items BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            INSERT INTO {FTS_TABLE} (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    """,
+}
+
+
+def create_search_index(connection):
+    """Creates items_fts and its triggers if missing, then indexes every item name"""
+    connection.execute(text(CREATE_TABLE))
+    for ddl in TRIGGERS.values():
+        connection.execute(text(ddl))
+    rebuild_search_index(connection)
+
+
+def drop_search_index(connection):
+    for name in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+def rebuild_search_index(connection):
+    """Re-reads every name from items into the index"""
+    connection.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def match_expression(query):
+    """Turns free text into an FTS5 query: every word, as a prefix, must match
+
+    Returns None when the query has no searchable words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def fts_match(expression):
+    """WHERE clause matching items_fts against an FTS5 expression"""
+    return literal_column(FTS_TABLE).op('MATCH')(expression)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--rebuild', action='store_true', help="Recreate the index and triggers from items")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        with get_engine().begin() as connection:
+            drop_search_index(connection)
+            create_search_index(connection)
+        print(" Search index rebuilt")
+    if args.query:
+        from models import Freebie
+
+        for freebie in Freebie.search(args.query, limit=args.limit):
+            print(f"  {freebie.print_details()} (KSh {freebie.value:,})")
@@ -2,19 +2,16 @@
 
 # Script goes here!
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Company, Dev, Freebie, Base
-import os
+from models import Company, Dev, Freebie, ensure_schema
+from database import Session, get_engine
+import reports
 
-# Create engine and session - fix the database path
-# Since we're running from lib directory, database should be in current directory
-db_path = os.path.join(os.path.dirname(__file__), 'freebies.db')
-engine = create_engine(f'sqlite:///{db_path}')
+# Shared engine and session factory from database.py
+engine = get_engine()
+db_path = engine.url.database
 
-# Create all tables
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+# Create the tables, unless alembic already has the database at head
+ensure_schema(engine)
 session = Session()
 
 print("Database connection established successfully!")
@@ -74,14 +71,14 @@ try:
         print(f"  - {dev.name}")
     
     print("\nCreated Freebies:")
-    for freebie in session.query(Freebie).all():
+    for freebie in Freebie.list_details(session):
         print(f"  - {freebie.item_name}: KSh {freebie.value:,} ({freebie.dev.name} from {freebie.company.name})")
     
-    total_value = sum(f.value for f in session.query(Freebie).all())
+    total_value = reports.total_value(session)
     print(f"\nTotal value of all freebies: KSh {total_value:,}")
 
 except Exception as e:
     print(f" Error creating seed data: {e}")
     session.rollback()
 finally:
-    session.close()
\ No newline at end of file
+    Session.remove()
\ No newline at end of file
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Shard-aware access to one freebies database per region
+
+A ShardMap names each shard's database URL and decides which shard owns a
+company: an explicit assignment if the config has one, otherwise a stable
+hash of the company name. Ids are local to a shard, so devs are matched by
+name across shards.
+
+ShardedFreebies runs the reporting and lookup queries on every shard in
+parallel in a process pool and merges the per-shard results.
+
+Config file (JSON):
+    {"shards": {"eu": "sqlite:////data/eu.db", "us": "sqlite:////data/us.db"},
+     "companies": {"ODM": "eu"}}
+
+Usage (from the lib directory):
+    python shards.py shards.json upgrade
+    python shards.py shards.json report
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import zlib
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import reports
+from models import Company, Dev, Freebie
+from database import create_configured_engine
+
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ShardMap:
+    """Shard name -> database URL, plus the company -> shard assignment"""
+
+    def __init__(self, shards, companies=None):
+        if not shards:
+            raise ValueError("A ShardMap needs at least one shard")
+        self.shards = dict(shards)
+        self.companies = dict(companies or {})
+        self._names = sorted(self.shards)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config['shards'], config.get('companies'))
+
+    def shard_for(self, company_name):
+        """Returns the name of the shard that owns company_name"""
+        if company_name in self.companies:
+            return self.companies[company_name]
+        return self._names[zlib.crc32(company_name.encode()) % len(self._names)]
+
+    def url_for(self, company_name):
+        return self.shards[self.shard_for(company_name)]
+
+    def session_for(self, company_name):
+        """Returns a session on the shard owning company_name, for writes"""
+        return Session(bind=_shard_engine(self.url_for(company_name)))
+
+
+# Per-process engine cache; each worker opens its own connections
+_ENGINES = {}
+
+
+def _shard_engine(url):
+    engine = _ENGINES.get(url)
+    if engine is None:
+        engine = _ENGINES[url] = create_configured_engine(url, pool_size=1, max_overflow=0)
+    return engine
+
+
+def _run_on_shard(url, task, args):
+    """Process-pool entry point: runs task(session, *args) on one shard"""
+    with Session(bind=_shard_engine(url)) as session:
+        return task(session, *args)
+
+
+# Shard tasks return plain picklable values, never ORM instances
+
+def _total_value(session):
+    return reports.total_value(session)
+
+
+def _value_by_company(session):
+    return reports.value_by_company(session)
+
+
+def _oldest_company(session):
+    oldest = Company.oldest_company(session)
+    return (oldest.name, oldest.founding_year) if oldest else None
+
+
+def _dev_companies(session, dev_name):
+    dev_ids = select(Dev.id).where(Dev.name == dev_name)
+    return session.scalars(
+        select(Company.name).join(Company.freebies).where(Freebie.dev_id.in_(dev_ids)).distinct()
+    ).all()
+
+
+def _upgrade_shard(url, revision):
+    config = Config(os.path.join(LIB_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(LIB_DIR, 'migrations'))
+    config.cmd_opts = argparse.Namespace(x=[f'db_url={url}'])
+    command.upgrade(config, revision)
+    return url
+
+
+class ShardedFreebies:
+    """Fans queries out over every shard in a process pool and merges them"""
+
+    def __init__(self, shard_map, max_workers=None):
+        self.shard_map = shard_map
+        self.max_workers = max_workers or len(shard_map.shards)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _fan_out(self, task, *args):
+        """Returns {shard name: result} for task run on every shard"""
+        names = sorted(self.shard_map.shards)
+        futures = [
+            self.executor.submit(_run_on_shard, self.shard_map.shards[name], task, args)
+            for name in names
+        ]
+        return {name: future.result() for name, future in zip(names, futures)}
+
+    def upgrade_all(self, revision='head'):
+        """Runs alembic upgrade on every shard in parallel"""
+        futures = [
+            self.executor.submit(_upgrade_shard, url, revision)
+            for url in self.shard_map.shards.values()
+        ]
+        return [future.result() for future in futures]
+
+    def total_value(self):
+        return sum(self._fan_out(_total_value).values())
+
+    def value_by_company(self, limit=None):
+        """Per-company rollups from every shard, highest total first"""
+        rows = [row for shard_rows in self._fan_out(_value_by_company).values() for row in shard_rows]
+        rows.sort(key=lambda row: row.total_value, reverse=True)
+        return rows[:limit] if limit is not None else rows
+
+    def oldest_company(self):
+        """Returns (name, founding_year) of the oldest company on any shard"""
+        candidates = [oldest for oldest in self._fan_out(_oldest_company).values()
+                      if oldest and oldest[1] is not None]
+        return min(candidates, key=lambda oldest: oldest[1], default=None)
+
+    def dev_companies(self, dev_name):
+        """Names of the companies, on any shard, that dev_name collected from"""
+        return sorted({name for names in self._fan_out(_dev_companies, dev_name).values() for name in names})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('config', help="Shard config JSON")
+    parser.add_argument('command', choices=['upgrade', 'report'])
+    parser.add_argument('--revision', default='head')
+    args = parser.parse_args()
+
+    with ShardedFreebies(ShardMap.from_json(args.config)) as sharded:
+        if args.command == 'upgrade':
+            for url in sharded.upgrade_all(args.revision):
+                print(f" Upgraded {url}")
+        else:
+            print(f"Total value across shards: KSh {sharded.total_value():,}")
+            oldest = sharded.oldest_company()
+            if oldest:
+                print(f"Oldest company: {oldest[0]} (founded {oldest[1]})")
+            print("Top companies by value:")
+            for row in sharded.value_by_company(limit=5):
+                print(f"  {row.name}: KSh {row.total_value:,}")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Columnar, read-only snapshot of the freebies table for analytics
+
+The freebies table is loaded once into NumPy arrays: dev_id, company_id,
+value and an interned item-name code per row. Two CSR indexes, one per
+direction, map each company and each dev to its row positions. Queries are
+then array operations rather than ORM instances.
+
+A snapshot saved with save() is a directory of .npy files. open() maps
+them read-only, so worker processes share the OS page cache instead of
+each loading a copy.
+
+Usage (from the lib directory):
+    python snapshot.py export /tmp/freebies_snapshot
+    python snapshot.py stats /tmp/freebies_snapshot
+
+Requires numpy.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import Freebie, Item
+from database import get_engine
+
+ARRAYS = ('freebie_id', 'dev_id', 'company_id', 'value', 'item_code',
+          'company_indptr', 'company_rows', 'dev_indptr', 'dev_rows')
+FETCH_SIZE = 100000
+
+
+def _csr(keys, size):
+    """Returns (indptr, rows): rows[indptr[k]:indptr[k + 1]] are the positions holding key k"""
+    rows = np.argsort(keys, kind='stable').astype(np.int64)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+    return indptr, rows
+
+
+def _group_sums(values, indptr, rows):
+    """Returns the int64 sum of values for each key of a _csr() adjacency
+
+    Differences of a running total stay exact, unlike bincount's float64
+    weights, which round sums beyond 2**53.
+    """
+    totals = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(values[rows], out=totals[1:])
+    return totals[indptr[1:]] - totals[indptr[:-1]]
+
+
+class FreebieSnapshot:
+    """Immutable columnar copy of freebies with company/dev adjacency"""
+
+    def __init__(self, arrays, item_names):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.item_names = item_names
+        self._item_codes = {name: code for code, name in enumerate(item_names)}
+
+    def __len__(self):
+        return len(self.freebie_id)
+
+    # Building and persisting
+
+    @classmethod
+    def load(cls, engine=None, fetch_size=FETCH_SIZE):
+        """Reads the freebies table into arrays, fetch_size rows at a time"""
+        engine = engine or get_engine()
+        with engine.connect() as connection:
+            count = connection.execute(select(func.count()).select_from(Freebie)).scalar()
+            columns = {
+                'freebie_id': np.empty(count, dtype=np.int64),
+                'dev_id': np.empty(count, dtype=np.int64),
+                'company_id': np.empty(count, dtype=np.int64),
+                'value': np.empty(count, dtype=np.int64),
+                'item_code': np.empty(count, dtype=np.int32),
+            }
+            item_codes = {}
+            result = connection.execution_options(stream_results=True).execute(
+                select(Freebie.id, Freebie.dev_id, Freebie.company_id, Freebie.value, Item.name)
+                .join(Item, Item.id == Freebie.item_id)
+                .order_by(Freebie.id)
+            )
+            position = 0
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                # Rows written after the COUNT are left for the next snapshot
+                rows = rows[:count - position]
+                end = position + len(rows)
+                ids, dev_ids, company_ids, values, item_names = zip(*rows)
+                columns['freebie_id'][position:end] = ids
+                columns['dev_id'][position:end] = dev_ids
+                columns['company_id'][position:end] = company_ids
+                columns['value'][position:end] = values
+                columns['item_code'][position:end] = [
+                    item_codes.setdefault(name, len(item_codes)) for name in item_names
+                ]
+                position = end
+                if position >= count:
+                    break
+            result.close()
+
+        for name, array in columns.items():
+            columns[name] = array[:position]
+        columns['company_indptr'], columns['company_rows'] = _csr(
+            columns['company_id'], int(columns['company_id'].max(initial=0)) + 1)
+        columns['dev_indptr'], columns['dev_rows'] = _csr(
+            columns['dev_id'], int(columns['dev_id'].max(initial=0)) + 1)
+        return cls(columns, list(item_codes))
+
+    def save(self, path):
+        """Writes the snapshot to a directory of .npy files plus meta.json"""
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'rows': len(self), 'item_names': self.item_names}, f)
+
+    @classmethod
+    def open(cls, path, mmap_mode='r'):
+        """Maps a saved snapshot; pages are shared between processes"""
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in ARRAYS
+        }
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(arrays, meta['item_names'])
+
+    # Adjacency
+
+    def company_rows_for(self, company_id):
+        """Row positions of the company's freebies"""
+        if company_id >= len(self.company_indptr) - 1:
+            return self.company_rows[:0]
+        return self.company_rows[self.company_indptr[company_id]:self.company_indptr[company_id + 1]]
+
+    def dev_rows_for(self, dev_id):
+        """Row positions of the dev's freebies"""
+        if dev_id >= len(self.dev_indptr) - 1:
+            return self.dev_rows[:0]
+        return self.dev_rows[self.dev_indptr[dev_id]:self.dev_indptr[dev_id + 1]]
+
+    # Vectorized model equivalents
+
+    def company_devs(self, company_id):
+        """Sorted dev ids that collected from the company (Company.devs)"""
+        return np.unique(self.dev_id[self.company_rows_for(company_id)])
+
+    def dev_companies(self, dev_id):
+        """Sorted company ids the dev collected from (Dev.companies)"""
+        return np.unique(self.company_id[self.dev_rows_for(dev_id)])
+
+    def received_one(self, dev_id, item_name):
+        """Dev.received_one() against the snapshot"""
+        code = self._item_codes.get(item_name)
+        if code is None:
+            return False
+        return bool((self.item_code[self.dev_rows_for(dev_id)] == code).any())
+
+    def who_received(self, item_name, dev_ids=None):
+        """Dev ids holding item_name, optionally limited to dev_ids"""
+        code = self._item_codes.get(item_name)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        holders = np.unique(self.dev_id[self.item_code == code])
+        if dev_ids is not None:
+            holders = holders[np.isin(holders, dev_ids)]
+        return holders
+
+    def value_by_company(self):
+        """Array indexed by company id: total freebie value"""
+        return _group_sums(self.value, self.company_indptr, self.company_rows)
+
+    def value_by_dev(self):
+        """Array indexed by dev id: total freebie value"""
+        return _group_sums(self.value, self.dev_indptr, self.dev_rows)
+
+    def freebies_by_company(self):
+        """Array indexed by company id: number of freebies"""
+        return np.diff(self.company_indptr)
+
+    def devs_sharing_companies(self, dev_id):
+        """Other devs who collected from at least one of dev_id's companies"""
+        companies = self.dev_companies(dev_id)
+        if not len(companies):
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate([self.company_rows_for(company) for company in companies])
+        devs = np.unique(self.dev_id[rows])
+        return devs[devs != dev_id]
+
+    def co_occurrence(self, dev_id):
+        """Returns (dev_ids, shared_company_counts) for devs sharing companies with dev_id"""
+        companies = self.dev_companies(dev_id)
+        if not len(companies):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        # One entry per (company, dev) pair, then count pairs per dev
+        pairs = [np.unique(self.dev_id[self.company_rows_for(company)]) for company in companies]
+        devs, counts = np.unique(np.concatenate(pairs), return_counts=True)
+        keep = devs != dev_id
+        return devs[keep], counts[keep]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export', 'stats'])
+    parser.add_argument('path', help="Snapshot directory")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        start = time.perf_counter()
+        snapshot = FreebieSnapshot.load()
+        snapshot.save(args.path)
+        print(f" Exported {len(snapshot):,} freebies to {args.path} in {time.perf_counter() - start:.1f}s")
+    else:
+        start = time.perf_counter()
+        snapshot = FreebieSnapshot.open(args.path)
+        print(f" Opened {len(snapshot):,} freebies in {(time.perf_counter() - start) * 1000:.1f}ms")
+        totals = snapshot.value_by_company()
+        top = np.argsort(totals)[::-1][:5]
+        print(" Top companies by value:")
+        for company_id in top:
+            print(f"   company {company_id}: KSh {totals[company_id]:,}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic datasets for benchmarking the freebie models
+
+Company popularity follows a Zipf distribution: with skew s, the company
+of rank k gets a share of freebies proportional to 1 / k**s, so skew=0 is
+uniform and larger values concentrate giveaways on a few big sponsors.
+
+Usage (from the lib directory):
+    python synthetic.py --companies 100 --devs 10000 --freebies 1000000 --skew 1.1
+"""
+
+import argparse
+import itertools
+import random
+import time
+
+from sqlalchemy import text
+
+from models import Base, Company, CompanyDev, Dev, EventCheckpoint, Freebie, FreebieEvent, Item, intern_items
+from database import get_engine
+
+ITEM_NAMES = [
+    "T-shirt", "Hoodie", "Sticker pack", "Water bottle", "Tote bag", "Notebook",
+    "Pen", "Socks", "Cap", "Mug", "Laptop sleeve", "USB drive", "Lanyard",
+    "Phone stand", "Power bank", "Headphones", "Keyboard", "Backpack",
+]
+
+
+def zipf_weights(n, skew):
+    """Returns cumulative Zipf weights for ranks 1..n"""
+    return list(itertools.accumulate(1.0 / rank ** skew for rank in range(1, n + 1)))
+
+
+def freebie_rows(companies, devs, freebies, skew=1.1, seed=0):
+    """Yields (item_name, value, dev_id, company_id) tuples for a dataset
+
+    Company and dev ids are assumed to be 1..companies and 1..devs. The same
+    arguments always yield the same rows.
+    """
+    rng = random.Random(seed)
+    cum_weights = zipf_weights(companies, skew)
+    company_ids = range(1, companies + 1)
+    for _ in range(freebies):
+        company_id = rng.choices(company_ids, cum_weights=cum_weights)[0]
+        item = ITEM_NAMES[rng.randrange(len(ITEM_NAMES))]
+        yield (
+            f"Company {company_id} {item}",
+            rng.randrange(100, 100000),
+            rng.randrange(1, devs + 1),
+            company_id,
+        )
+
+
+def populate(engine=None, companies=100, devs=10000, freebies=100000, skew=1.1, seed=0,
+             batch_size=50000):
+    """Creates the schema if needed and fills it with a synthetic dataset
+
+    Existing rows are deleted first, including the change feed and its
+    consumer checkpoints, and event numbering restarts at 1. Returns the
+    elapsed seconds.
+    """
+    engine = engine or get_engine()
+    start = time.perf_counter()
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+
+    with engine.begin() as connection:
+        connection.execute(Freebie.__table__.delete())
+        connection.execute(Company.__table__.delete())
+        connection.execute(Dev.__table__.delete())
+        connection.execute(Item.__table__.delete())
+        connection.execute(CompanyDev.__table__.delete())
+        # After the freebies, whose delete triggers append events of their own
+        connection.execute(FreebieEvent.__table__.delete())
+        connection.execute(EventCheckpoint.__table__.delete())
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'freebie_events'"))
+        connection.execute(Company.__table__.insert(), [
+            {'id': i, 'name': f"Company {i}", 'founding_year': rng.randrange(1950, 2026)}
+            for i in range(1, companies + 1)
+        ])
+        connection.execute(Dev.__table__.insert(), [
+            {'id': i, 'name': f"Dev {i}"} for i in range(1, devs + 1)
+        ])
+
+    insert_sql = "INSERT INTO freebies (item_id, value, dev_id, company_id) VALUES (?, ?, ?, ?)"
+    rows = freebie_rows(companies, devs, freebies, skew, seed)
+    item_ids = {}
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        with engine.begin() as connection:
+            new_names = {row[0] for row in batch} - item_ids.keys()
+            if new_names:
+                item_ids.update(intern_items(connection, new_names))
+            connection.exec_driver_sql(insert_sql, [(item_ids[row[0]], *row[1:]) for row in batch])
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=100)
+    parser.add_argument('--devs', type=int, default=10000)
+    parser.add_argument('--freebies', type=int, default=100000)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.freebies:,} freebies over {args.companies:,} companies "
+          f"and {args.devs:,} devs (skew {args.skew})...")
+    elapsed = populate(companies=args.companies, devs=args.devs, freebies=args.freebies,
+                       skew=args.skew, seed=args.seed)
+    print(f" Done in {elapsed:.1f}s")